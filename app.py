@@ -1,18 +1,36 @@
 import os
-from datetime import datetime, date
+import multiprocessing
+import socket
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, date, time, timedelta
+from collections import OrderedDict, deque
+from functools import lru_cache
+from time import monotonic
 from io import StringIO
 import io
+import math
 import csv
+import base64
+import json
+import click
 import pytz
 
 # Set Thailand timezone
 TH_TZ = pytz.timezone('Asia/Bangkok')
 
 from flask import (Flask, render_template, request, redirect, url_for, flash,
-                   send_file, jsonify)
+                   send_file, jsonify, abort, Response, stream_with_context)
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager, UserMixin, login_user, login_required, logout_user, current_user
-from werkzeug.security import generate_password_hash, check_password_hash
+from werkzeug.security import generate_password_hash, check_password_hash, DEFAULT_PBKDF2_ITERATIONS
+from werkzeug.middleware.proxy_fix import ProxyFix
+
+from instrumentation import Instrumentation
+from assets import StaticAssets, Compression
+import reports
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DB_PATH = os.path.join(BASE_DIR, 'data.db')
@@ -28,6 +46,50 @@ if DATABASE_URL.startswith('postgres://'):
 
 app.config['SQLALCHEMY_DATABASE_URI'] = DATABASE_URL
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+if DATABASE_URL.startswith('sqlite'):
+    # applied to every new connection by sqlite_pragmas(); WAL lets readers and
+    # a writer work at the same time, NORMAL only fsyncs at checkpoints
+    app.config['SQLITE_PRAGMAS'] = {
+        'journal_mode': os.environ.get('SQLITE_JOURNAL_MODE', 'WAL'),
+        'synchronous': os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL'),
+        'busy_timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT', 5000)),  # ms
+        'mmap_size': int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)),  # bytes
+        'cache_size': int(os.environ.get('SQLITE_CACHE_SIZE', -64 * 1024)),  # negative = KiB
+    }
+else:
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', 5)),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 10)),
+        'pool_timeout': int(os.environ.get('DB_POOL_TIMEOUT', 30)),
+        'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', 1800)),  # below typical proxy idle timeouts
+        'pool_pre_ping': os.environ.get('DB_POOL_PRE_PING', '1') != '0',
+    }
+app.config['STATS_CACHE_SIZE'] = int(os.environ.get('STATS_CACHE_SIZE', 256))
+# per-process cache of logged-in users (0 turns it off), and how often in seconds a worker
+# rereads UserVersion: a change to a user reaches the cached copies at most this late
+app.config['USER_CACHE_SIZE'] = int(os.environ.get('USER_CACHE_SIZE', 1024))
+app.config['USER_VERSION_CHECK'] = float(os.environ.get('USER_VERSION_CHECK', 5))
+# werkzeug hash method/salt for new hashes; older hashes are upgraded on the next login
+app.config['PASSWORD_HASH_METHOD'] = os.environ.get('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:260000')
+app.config['PASSWORD_SALT_LENGTH'] = int(os.environ.get('PASSWORD_SALT_LENGTH', 16))
+# hashing processes per worker (0 hashes inline; a pool only helps with a spare CPU)
+# and how many hashes may be in flight
+app.config['PASSWORD_HASH_WORKERS'] = int(os.environ.get('PASSWORD_HASH_WORKERS', min(2, (os.cpu_count() or 1) - 1)))
+app.config['PASSWORD_HASH_QUEUE'] = int(os.environ.get('PASSWORD_HASH_QUEUE', 16))
+# seconds to wait on the pool before giving up on it and hashing inline
+app.config['PASSWORD_HASH_TIMEOUT'] = float(os.environ.get('PASSWORD_HASH_TIMEOUT', 10))
+# login attempts per address per LOGIN_RATE_WINDOW seconds
+app.config['LOGIN_IP_RATE_LIMIT'] = int(os.environ.get('LOGIN_IP_RATE_LIMIT', 60))
+app.config['LOGIN_RATE_WINDOW'] = float(os.environ.get('LOGIN_RATE_WINDOW', 60))
+# per username: failures allowed before backing off, then waits doubling up to LOGIN_BACKOFF_MAX seconds
+app.config['LOGIN_BACKOFF_AFTER'] = int(os.environ.get('LOGIN_BACKOFF_AFTER', 5))
+app.config['LOGIN_BACKOFF_MAX'] = float(os.environ.get('LOGIN_BACKOFF_MAX', 60))
+# reverse proxies in front of the app whose X-Forwarded-For/-Proto are trusted (one on Railway and Heroku)
+BEHIND_PROXY = os.environ.get('RAILWAY_ENVIRONMENT') or os.environ.get('DYNO')
+app.config['PROXY_HOPS'] = int(os.environ.get('PROXY_HOPS', 1 if BEHIND_PROXY else 0))
+if app.config['PROXY_HOPS']:
+    # so request.remote_addr (and the login limits keyed on it) is the client, not the proxy
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['PROXY_HOPS'], x_proto=app.config['PROXY_HOPS'])
 
 # Enable production mode if not in debug
 if not os.environ.get('FLASK_DEBUG', False):
@@ -43,6 +105,16 @@ db = SQLAlchemy(app)
 login_manager = LoginManager(app)
 login_manager.login_view = 'login'
 
+def sqlite_pragmas(dbapi_conn, connection_record):
+    cursor = dbapi_conn.cursor()
+    for name, value in app.config['SQLITE_PRAGMAS'].items():
+        cursor.execute(f'PRAGMA {name} = {value}')
+    cursor.close()
+
+if 'SQLITE_PRAGMAS' in app.config:
+    with app.app_context():
+        db.event.listen(db.engine, 'connect', sqlite_pragmas)
+
 # Predefined lookup lists
 INCOME_LOOKUP = [
     'ถ่ายเอกสาร A4 ขาวดำ', 'ถ่ายเอกสาร A4 สี', 'print A4 ขาวดำ', 'print A4 สี',
@@ -52,6 +124,162 @@ INCOME_LOOKUP = [
 
 EXPENSE_LOOKUP = ['ค่าหมึก', 'ค่ากระดาษ', 'ค่าน้ำ', 'ค่าไฟ', 'อื่นๆ']
 
+# Password hashing is CPU-bound, so it runs in a small per-worker process pool
+# instead of the request thread. At most PASSWORD_HASH_QUEUE hashes are in
+# flight; past that requests get a 503 instead of piling up behind the pool.
+_hash_executor = None
+_hash_executor_lock = threading.Lock()
+# never fork the threaded worker itself: a child could inherit a lock held by another thread
+_hash_start_method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+_hash_slots = threading.BoundedSemaphore(max(1, app.config['PASSWORD_HASH_QUEUE']))
+
+class PasswordHashBusy(Exception):
+    pass
+
+def hash_executor():
+    global _hash_executor
+    with _hash_executor_lock:
+        if _hash_executor is None:
+            _hash_executor = ProcessPoolExecutor(app.config['PASSWORD_HASH_WORKERS'],
+                                                 mp_context=multiprocessing.get_context(_hash_start_method))
+        return _hash_executor
+
+def reset_hash_executor():
+    # a forked child (a gunicorn worker) inherits the pool object but none of its threads or pipes,
+    # nor a forkserver it can talk to: that one belongs to the parent
+    global _hash_executor, _hash_executor_lock, _hash_start_method
+    if _hash_executor is not None:
+        _hash_start_method = 'spawn'
+    _hash_executor = None
+    _hash_executor_lock = threading.Lock()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=reset_hash_executor)
+
+def run_hash(fn, *args):
+    global _hash_executor
+    if app.config['PASSWORD_HASH_WORKERS'] <= 0:
+        return fn(*args)
+    if not _hash_slots.acquire(blocking=False):
+        raise PasswordHashBusy()
+    executor = hash_executor()
+    try:
+        return executor.submit(fn, *args).result(timeout=app.config['PASSWORD_HASH_TIMEOUT'])
+    except (BrokenProcessPool, FutureTimeout):
+        # a pool process died (e.g. OOM-killed) or the pool is wedged; start a fresh pool next time
+        with _hash_executor_lock:
+            if _hash_executor is executor:
+                _hash_executor = None
+        executor.shutdown(wait=False, cancel_futures=True)
+        return fn(*args)
+    finally:
+        _hash_slots.release()
+
+def hash_password(pw):
+    return run_hash(generate_password_hash, pw, app.config['PASSWORD_HASH_METHOD'],
+                    app.config['PASSWORD_SALT_LENGTH'])
+
+def hash_method_prefix(method):
+    """The method field werkzeug writes for ``method``, e.g. 'pbkdf2:sha256' -> 'pbkdf2:sha256:260000'."""
+    # worked out from the string: hashing a sample would cost a full pbkdf2 run on each worker's first login
+    name, _, params = method.partition(':')
+    if name == 'pbkdf2':
+        hash_name, _, iterations = params.partition(':')
+        return f'pbkdf2:{hash_name or "sha256"}:{iterations or DEFAULT_PBKDF2_ITERATIONS}'
+    return method
+
+def password_needs_rehash(pwhash):
+    method, _, rest = pwhash.partition('$')
+    salt = rest.partition('$')[0]
+    return (method != hash_method_prefix(app.config['PASSWORD_HASH_METHOD'])
+            or len(salt) != app.config['PASSWORD_SALT_LENGTH'])
+
+class RateLimiter:
+    """Sliding-window attempt counter per key, in process memory (so per gunicorn worker)."""
+
+    def __init__(self, window, maxkeys=10000):
+        self.window = window
+        self.maxkeys = maxkeys
+        self._hits = {}
+        self._lock = threading.Lock()
+
+    def hit(self, key, limit):
+        """Record an attempt for ``key``; False if ``limit`` attempts were already made in the window."""
+        now = monotonic()
+        with self._lock:
+            hits = self._hits.get(key)
+            if hits is None:
+                if len(self._hits) >= self.maxkeys:
+                    self._prune(now)
+                hits = self._hits[key] = deque()
+            while hits and hits[0] <= now - self.window:
+                hits.popleft()
+            if len(hits) >= limit:
+                return False
+            hits.append(now)
+            return True
+
+    def reset(self, key):
+        with self._lock:
+            self._hits.pop(key, None)
+
+    def _prune(self, now):
+        for key in [k for k, hits in self._hits.items() if not hits or hits[-1] <= now - self.window]:
+            del self._hits[key]
+        if len(self._hits) >= self.maxkeys:
+            self._hits.clear()
+
+class LoginBackoff:
+    """Failed logins per username; past ``free`` failures the next attempt has to wait, twice as long each time.
+
+    Unlike a fixed lockout, an account someone else is guessing at stays
+    reachable: the wait is capped at ``max_wait`` seconds, and a successful
+    login or ``forget`` seconds without failures clear it. In process memory,
+    like RateLimiter.
+    """
+
+    def __init__(self, free, max_wait, forget=900, maxkeys=10000):
+        self.free = free
+        self.max_wait = max_wait
+        self.forget = forget
+        self.maxkeys = maxkeys
+        self._failures = {}  # username -> (count, monotonic time of the last failure)
+        self._lock = threading.Lock()
+
+    def _delay(self, count):
+        return 0 if count < self.free else min(self.max_wait, 2 ** (count - self.free))
+
+    def wait(self, key):
+        """Seconds until ``key`` may try again; 0 if it may now."""
+        now = monotonic()
+        with self._lock:
+            count, last = self._failures.get(key, (0, now))
+            if now - last > self.forget:
+                self._failures.pop(key, None)
+                return 0
+            return max(0.0, last + self._delay(count) - now)
+
+    def fail(self, key):
+        now = monotonic()
+        with self._lock:
+            if key not in self._failures and len(self._failures) >= self.maxkeys:
+                self._prune(now)
+            count, last = self._failures.get(key, (0, now))
+            self._failures[key] = (count + 1 if now - last <= self.forget else 1, now)
+
+    def reset(self, key):
+        with self._lock:
+            self._failures.pop(key, None)
+
+    def _prune(self, now):
+        for key in [k for k, (_, last) in self._failures.items() if now - last > self.forget]:
+            del self._failures[key]
+        if len(self._failures) >= self.maxkeys:
+            self._failures.clear()
+
+login_limiter = RateLimiter(app.config['LOGIN_RATE_WINDOW'])
+login_backoff = LoginBackoff(app.config['LOGIN_BACKOFF_AFTER'], app.config['LOGIN_BACKOFF_MAX'])
+
 # Models
 class User(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -60,10 +288,10 @@ class User(UserMixin, db.Model):
     is_admin = db.Column(db.Boolean, default=False)
 
     def set_password(self, pw):
-        self.password_hash = generate_password_hash(pw)
+        self.password_hash = hash_password(pw)
 
     def check_password(self, pw):
-        return check_password_hash(self.password_hash, pw)
+        return run_hash(check_password_hash, self.password_hash, pw)
 
 class Entry(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -74,24 +302,154 @@ class Entry(db.Model):
     amount = db.Column(db.Float, nullable=False)
     notes = db.Column(db.String(300), nullable=True)
     created_at = db.Column(db.DateTime, default=lambda: datetime.now(TH_TZ))
+    # Thai-local period of created_at, derived on write so grouping never needs timestamp functions
+    local_date = db.Column(db.Date, nullable=True, index=True)
+    local_month = db.Column(db.Integer, nullable=True, index=True)  # YYYYMM
+    local_year = db.Column(db.Integer, nullable=True, index=True)
 
     user = db.relationship('User', backref='entries')
 
+    @staticmethod
+    def created_at_columns(dt):
+        """created_at as stored (naive Thai wall-clock time) and the local period columns derived from it.
+
+        Every write goes through here: psycopg2 sends an aware value as timestamptz,
+        which PostgreSQL would shift to the session's timezone (UTC on Railway).
+        """
+        dt = thai_wall_clock(dt)
+        return {'created_at': dt, **local_period(dt)}
+
+    def set_created_at(self, dt):
+        for name, value in self.created_at_columns(dt).items():
+            setattr(self, name, value)
+
+    __table_args__ = (
+        db.Index('ix_entry_created_at', 'created_at'),
+        db.Index('ix_entry_user_id_created_at', 'user_id', 'created_at'),
+    )
+
+class DailyRollup(db.Model):
+    # Per-day totals keyed like the charts group them; kept in step with Entry writes
+    day = db.Column(db.Date, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    is_income = db.Column(db.Boolean, primary_key=True)
+    category_key = db.Column(db.String(200), primary_key=True)
+    total = db.Column(db.Float, nullable=False, default=0)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+class UserVersion(db.Model):
+    # One row, bumped with every change to a user's role, password or existence; cached users stay valid while it matches
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+class StatsVersion(db.Model):
+    # Bumped whenever a month's rollups change; cached stats for that month stay valid while it matches
+    period = db.Column(db.Integer, primary_key=True)  # YYYYMM
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, nullable=False)
+
+class ArchivedYear(db.Model):
+    # A closed year whose entries were moved out of `entry` by archive_year()
+    year = db.Column(db.Integer, primary_key=True)
+    entries = db.Column(db.Integer, nullable=False, default=0)  # moved when archived
+    archived_at = db.Column(db.DateTime, nullable=False)
+
+class PeriodSummary(db.Model):
+    # Frozen totals of an archived year: one row set per month (period YYYYMM) and one for the year (YYYY)
+    grain = db.Column(db.String(5), primary_key=True)  # 'month' or 'year'
+    period = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    is_income = db.Column(db.Boolean, primary_key=True)
+    category_key = db.Column(db.String(200), primary_key=True)
+    total = db.Column(db.Float, nullable=False, default=0)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+class Job(db.Model):
+    # Background work (imports, exports, bulk deletes) run outside the request by the job pool
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(30), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued/running/done/failed
+    progress = db.Column(db.Integer, nullable=False, default=0)
+    total = db.Column(db.Integer, nullable=True)
+    params = db.Column(db.Text, nullable=False, default='{}')
+    result = db.Column(db.Text, nullable=True)
+    error = db.Column(db.String(500), nullable=True)
+    artifact = db.Column(db.String(300), nullable=True)
+    worker = db.Column(db.String(120), nullable=True)
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(TH_TZ))
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    def to_dict(self):
+        return {
+            'id': self.id, 'kind': self.kind, 'status': self.status,
+            'progress': self.progress, 'total': self.total,
+            'result': json.loads(self.result) if self.result else None,
+            'error': self.error,
+            'download_url': url_for('job_download', job_id=self.id) if self.artifact and self.status == 'done' else None,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+class CheckedValue:
+    """A database value this process rereads at most once per ``interval`` seconds."""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._value = None
+        self._read_at = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        """The value if it was read less than ``interval`` seconds ago, else None."""
+        with self._lock:
+            if self._read_at is not None and monotonic() - self._read_at < self.interval:
+                return self._value
+            return None
+
+    def set(self, value):
+        with self._lock:
+            self._value, self._read_at = value, monotonic()
+
+    def expire(self):
+        with self._lock:
+            self._read_at = None
+
+user_version_seen = CheckedValue(app.config['USER_VERSION_CHECK'])
+
+def user_version():
+    version = user_version_seen.get()
+    if version is None:
+        version = db.session.scalar(db.select(UserVersion.version).where(UserVersion.id == 1)) or 0
+        user_version_seen.set(version)
+    return version
+
+def bump_user_version():
+    """Invalidate every worker's cached users; call in the transaction that changes a user.
+
+    This worker rereads the version on its next request; the others within USER_VERSION_CHECK seconds.
+    """
+    t = UserVersion.__table__
+    stmt = upsert(t)
+    stmt = stmt.on_conflict_do_update(index_elements=[t.c.id], set_={'version': t.c.version + 1})
+    db.session.execute(stmt, {'id': 1, 'version': 1})
+    user_version_seen.expire()
+
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
-
-# Ensure DB
-@app.before_first_request
-def create_tables():
-    db.create_all()
-    # create default admin if not exists
-    admin = User.query.filter_by(username='admin').first()
-    if not admin:
-        a = User(username='admin', is_admin=True)
-        a.set_password('admin')
-        db.session.add(a)
-        db.session.commit()
+    # served from user_cache while UserVersion matches, which is reread at most every USER_VERSION_CHECK seconds
+    version = user_version()  # read first, so a cached user is never older than its version
+    cached = user_cache.get(int(user_id))
+    if cached is not None and cached[0] == version:
+        # detached and kept out of the session: anything that reads or writes the
+        # user's credentials queries the row itself instead of getting this copy
+        user = User(**cached[1])
+        db.make_transient_to_detached(user)
+        return user
+    user = User.query.get(int(user_id))
+    if user is not None:
+        user_cache.set(user.id, (version, {c.key: getattr(user, c.key) for c in User.__table__.columns}))
+    return user
 
 # Utility functions
 def to_thai_time(dt):
@@ -100,40 +458,601 @@ def to_thai_time(dt):
         return None
     return dt
 
+def thai_wall_clock(dt):
+    """``dt`` as naive Thai wall-clock time; naive values are Thai time already."""
+    if dt.tzinfo is None:
+        return dt
+    return dt.astimezone(TH_TZ).replace(tzinfo=None)
+
+def local_period(dt):
+    """Thai-local date, YYYYMM and year for a created_at value (naive values are Thai time already)."""
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(TH_TZ)
+    return {'local_date': dt.date(), 'local_month': dt.year * 100 + dt.month, 'local_year': dt.year}
+
 def now_thai():
     """Get current time in Thailand timezone"""
     return datetime.now(TH_TZ)
 
-def summarize(user_id=None):
-    # Returns daily, monthly, yearly totals (income - expense)
-    q = Entry.query
-    if user_id:
-        q = q.filter_by(user_id=user_id)
-    entries = q.all()
-    today = now_thai().date()
-    daily = sum(e.amount if e.is_income else -e.amount for e in entries if to_thai_time(e.created_at).date() == today)
-    monthly = sum(e.amount if e.is_income else -e.amount for e in entries if to_thai_time(e.created_at).year == today.year and to_thai_time(e.created_at).month == today.month)
-    yearly = sum(e.amount if e.is_income else -e.amount for e in entries if to_thai_time(e.created_at).year == today.year)
-    return {'daily': daily, 'monthly': monthly, 'yearly': yearly}
-
-def get_monthly_stats(month=None, year=None):
-    # Get income, expense and balance for a specific month
-    if month is None:
-        month = datetime.utcnow().month
-    if year is None:
-        year = datetime.utcnow().year
-    
-    entries = Entry.query.filter(
-        db.extract('year', Entry.created_at) == year,
-        db.extract('month', Entry.created_at) == month
-    ).all()
-    
-    income = sum(e.amount for e in entries if e.is_income)
-    expense = sum(e.amount for e in entries if not e.is_income)
+class KeysetPage:
+    """One page of a keyset (seek) pagination, with opaque cursors to its neighbours."""
+
+    def __init__(self, items, next_cursor=None, prev_cursor=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+def encode_cursor(direction, values):
+    raw = json.dumps([direction] + [v.isoformat() if isinstance(v, datetime) else v for v in values])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+def decode_cursor(token, keys):
+    """Return (direction, values) or (None, None) for a missing or malformed token."""
+    if not token:
+        return None, None
+    try:
+        raw = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+        if not isinstance(raw, list):
+            return None, None
+        direction, values = raw[0], raw[1:]
+        if direction not in ('n', 'p') or len(values) != len(keys):
+            return None, None
+        # coerced to the key's type, so a forged value cannot reach the database as the wrong one
+        values = [datetime.fromisoformat(v) if isinstance(k.type, db.DateTime) else k.type.python_type(v)
+                  for k, v in zip(keys, values)]
+        return direction, values
+    except (ValueError, TypeError, IndexError):
+        return None, None
+
+def keyset_query(q, keys, cursor=None, per_page=10, descending=True):
+    """``(direction, query)`` for the page of ``q`` that ``cursor`` points at, with one extra row to detect more."""
+    direction, values = decode_cursor(cursor, keys)
+    row = db.tuple_(*keys)
+    q = q.add_columns(*keys)
+    forward, backward = (db.desc, db.asc) if descending else (db.asc, db.desc)
+    if direction == 'p':
+        before = row > db.tuple_(*values) if descending else row < db.tuple_(*values)
+        q = q.filter(before).order_by(*[backward(k) for k in keys])
+    else:
+        if direction == 'n':
+            q = q.filter(row < db.tuple_(*values) if descending else row > db.tuple_(*values))
+        q = q.order_by(*[forward(k) for k in keys])
+    return direction, q.limit(per_page + 1)
+
+def keyset_paginate(q, keys, cursor=None, per_page=10, descending=True):
+    """Seek-paginate ``q`` in descending (or ascending) order of ``keys`` without OFFSET or COUNT.
+
+    ``keys`` may be columns or labelled expressions (e.g. a search score) and must
+    end in a unique column (e.g. the primary key) so the ordering is total.
+    """
+    direction, q = keyset_query(q, keys, cursor, per_page, descending)
+    rows = q.all()
+    more = len(rows) > per_page
+    rows = rows[:per_page]
+    if direction == 'p':
+        rows.reverse()
+    if not rows:
+        return KeysetPage([])
+
+    has_next = more if direction != 'p' else True
+    has_prev = more if direction == 'p' else direction == 'n'
+    return KeysetPage([r[0] for r in rows],
+                      next_cursor=encode_cursor('n', rows[-1][1:]) if has_next else None,
+                      prev_cursor=encode_cursor('p', rows[0][1:]) if has_prev else None)
+
+# Full-text search over category / custom_name / notes.
+# Thai is written without spaces between words, so word tokenizers (FTS5 unicode61,
+# tsvector) would index whole phrases as one token. Trigrams match any substring
+# regardless of script: FTS5's trigram tokenizer on SQLite, pg_trgm on PostgreSQL.
+SEARCH_DOCUMENT = "coalesce(entry.category, '') || ' ' || coalesce(entry.custom_name, '') || ' ' || coalesce(entry.notes, '')"
+SEARCH_DDL = {
+    'sqlite': [
+        "CREATE VIRTUAL TABLE IF NOT EXISTS entry_fts USING fts5("
+        "category, custom_name, notes, content='entry', content_rowid='id', tokenize='trigram')",
+        "CREATE TRIGGER IF NOT EXISTS entry_fts_ai AFTER INSERT ON entry BEGIN "
+        "INSERT INTO entry_fts(rowid, category, custom_name, notes) VALUES (new.id, new.category, new.custom_name, new.notes); END",
+        "CREATE TRIGGER IF NOT EXISTS entry_fts_ad AFTER DELETE ON entry BEGIN "
+        "INSERT INTO entry_fts(entry_fts, rowid, category, custom_name, notes) VALUES ('delete', old.id, old.category, old.custom_name, old.notes); END",
+        "CREATE TRIGGER IF NOT EXISTS entry_fts_au AFTER UPDATE OF category, custom_name, notes ON entry BEGIN "
+        "INSERT INTO entry_fts(entry_fts, rowid, category, custom_name, notes) VALUES ('delete', old.id, old.category, old.custom_name, old.notes); "
+        "INSERT INTO entry_fts(rowid, category, custom_name, notes) VALUES (new.id, new.category, new.custom_name, new.notes); END",
+    ],
+    'postgresql': [
+        "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+        f"CREATE INDEX IF NOT EXISTS ix_entry_search_trgm ON entry USING gin (({SEARCH_DOCUMENT}) gin_trgm_ops)",
+    ],
+}
+SEARCH_REBUILD = {
+    'sqlite': "INSERT INTO entry_fts(entry_fts) VALUES ('rebuild')",
+}
+# merges the index segments, e.g. after archive_year() deleted a year's worth of rows
+SEARCH_OPTIMIZE = {
+    'sqlite': "INSERT INTO entry_fts(entry_fts) VALUES ('optimize')",
+}
+_search_index_ready = False
+
+def create_search_index(conn, rebuild=False):
+    """Create the search index (and, on SQLite, the triggers that keep it in sync with entry writes)."""
+    for stmt in SEARCH_DDL.get(conn.dialect.name, []):
+        conn.execute(db.text(stmt))
+    if rebuild and conn.dialect.name in SEARCH_REBUILD:
+        conn.execute(db.text(SEARCH_REBUILD[conn.dialect.name]))
+
+@db.event.listens_for(Entry.__table__, 'after_create')
+def _entry_table_created(target, connection, **kw):
+    create_search_index(connection)
+
+def search_index_ready():
+    global _search_index_ready
+    if not _search_index_ready:
+        dialect = db.engine.dialect.name
+        _search_index_ready = dialect == 'postgresql' or (
+            dialect == 'sqlite' and db.inspect(db.engine).has_table('entry_fts'))
+    return _search_index_ready
+
+def escape_like(text):
+    return text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+def search_entries(text, years=()):
+    """Return ``(query, keys)`` for entries matching ``text``, best matches first.
+
+    Trigram indexes need at least three characters; shorter terms fall back to a
+    plain substring scan ordered by date. Given archived ``years``, their
+    archives are searched as well, by that same scan (the indexes only cover
+    `entry`).
+    """
+    if years:
+        e = db.aliased(Entry, entry_source(years))
+        pattern = f'%{escape_like(text)}%'
+        q = db.session.query(e).filter(e.category.ilike(pattern, escape='\\') | e.custom_name.ilike(pattern, escape='\\')
+                                       | e.notes.ilike(pattern, escape='\\'))
+        return q, [e.created_at, e.id]
+    dialect = db.engine.dialect.name
+    if len(text) >= 3 and search_index_ready():
+        if dialect == 'sqlite':
+            phrase = '"' + text.replace('"', '""') + '"'
+            match = db.text('SELECT rowid AS id, rank FROM entry_fts WHERE entry_fts MATCH :phrase') \
+                .bindparams(phrase=phrase).columns(id=db.Integer, rank=db.Float).subquery()
+            # FTS5 rank is bm25, where lower is better
+            score = (-match.c.rank).label('score')
+            return Entry.query.join(match, match.c.id == Entry.id), [score, Entry.created_at, Entry.id]
+        document = db.literal_column(SEARCH_DOCUMENT, type_=db.String)
+        score = db.func.word_similarity(text, document).label('score')
+        q = Entry.query.filter(document.ilike(f'%{escape_like(text)}%', escape='\\'))
+        return q, [score, Entry.created_at, Entry.id]
+    pattern = f'%{escape_like(text)}%'
+    q = Entry.query.filter(Entry.category.ilike(pattern, escape='\\') | Entry.custom_name.ilike(pattern, escape='\\')
+                           | Entry.notes.ilike(pattern, escape='\\'))
+    return q, [Entry.created_at, Entry.id]
+
+class LRUCache:
+    """Small thread-safe LRU mapping with hit/miss counters and an optional TTL in seconds."""
+
+    def __init__(self, maxsize=256, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key in self._data:
+                expires, value = self._data[key]
+                if expires is None or expires > monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (None if self.ttl is None else monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def discard(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def discard_where(self, predicate):
+        with self._lock:
+            for key in [k for k in self._data if predicate(k)]:
+                del self._data[key]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        return {'size': len(self._data), 'maxsize': self.maxsize, 'hits': self.hits, 'misses': self.misses}
+
+# (endpoint, kind, month, year) -> (version from stats_version(), payload)
+stats_cache = LRUCache(app.config['STATS_CACHE_SIZE'])
+
+# user id -> (UserVersion.version, User column values), for load_user. Routes that
+# change a user bump UserVersion, so every worker reloads its users once it rereads
+# the version, at most USER_VERSION_CHECK seconds later.
+user_cache = LRUCache(app.config['USER_CACHE_SIZE'])
+
+# per-route latency, SQL counts/time, slow-query and N+1 logging, served at /metrics
+metrics = Instrumentation(app, db)
+metrics.gauge('stats_cache', 'Stats cache size, capacity and hit/miss counts.', stats_cache.stats)
+metrics.gauge('user_cache', 'User cache size, capacity and hit/miss counts.', user_cache.stats)
+
+# content-hashed static URLs with immutable caching, gzip/brotli for HTML/JSON/CSV
+StaticAssets(app)
+Compression(app)
+
+def period_bounds(today):
+    """Half-open [start, end) datetime ranges for the day, month and year containing ``today``.
+
+    created_at holds naive Thai wall-clock time, so the bounds are naive too.
+    """
+    start_of_day = datetime.combine(today, time.min)
+    start_of_month = start_of_day.replace(day=1)
+    start_of_year = start_of_month.replace(month=1)
+    if start_of_month.month == 12:
+        next_month = start_of_month.replace(year=start_of_month.year + 1, month=1)
+    else:
+        next_month = start_of_month.replace(month=start_of_month.month + 1)
+    return {
+        'daily': (start_of_day, start_of_day + timedelta(days=1)),
+        'monthly': (start_of_month, next_month),
+        'yearly': (start_of_year, start_of_year.replace(year=start_of_year.year + 1)),
+    }
+
+def category_key(category, custom_name):
+    """Label an entry is grouped under in charts and rollups."""
+    return category or custom_name or 'อื่นๆ'
+
+def rollup_key(e):
+    return (e.local_date or local_period(e.created_at)['local_date'], e.user_id, bool(e.is_income),
+            category_key(e.category, e.custom_name))
+
+def add_rollup_delta(deltas, key, amount, sign=1):
+    d = deltas.setdefault(key, [0.0, 0])
+    d[0] += sign * amount
+    d[1] += sign
+
+def track_rollup(deltas, e, sign=1):
+    """Accumulate ``e``'s contribution (or its removal when sign=-1) into ``deltas``."""
+    add_rollup_delta(deltas, rollup_key(e), e.amount, sign)
+
+def apply_rollups(deltas):
+    """Upsert accumulated deltas into DailyRollup within the current transaction."""
+    rows = [{'day': k[0], 'user_id': k[1], 'is_income': k[2], 'category_key': k[3],
+             'total': v[0], 'count': v[1]} for k, v in deltas.items() if v[1] or v[0]]
+    if not rows:
+        return
+    t = DailyRollup.__table__
+    stmt = upsert(t)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[t.c.day, t.c.user_id, t.c.is_income, t.c.category_key],
+        set_={'total': t.c.total + stmt.excluded.total, 'count': t.c.count + stmt.excluded.count})
+    db.session.execute(stmt, rows)
+    if any(r['count'] < 0 for r in rows):
+        DailyRollup.query.filter(DailyRollup.count <= 0).delete(synchronize_session=False)
+    bump_stats_versions({r['day'].year * 100 + r['day'].month for r in rows})
+
+def upsert(table):
+    """INSERT construct supporting on_conflict_do_update for the current dialect."""
+    if db.engine.dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(table)
+
+def bump_stats_versions(periods):
+    """Mark the given YYYYMM periods as changed, invalidating cached stats for them in every worker."""
+    if not periods:
+        return
+    now = now_thai().replace(tzinfo=None)
+    t = StatsVersion.__table__
+    stmt = upsert(t)
+    stmt = stmt.on_conflict_do_update(index_elements=[t.c.period],
+                                      set_={'version': t.c.version + 1, 'updated_at': stmt.excluded.updated_at})
+    db.session.execute(stmt, [{'period': p, 'version': 1, 'updated_at': now} for p in sorted(periods)])
+    stats_cache.discard_where(lambda key: key[3] * 100 + key[2] in periods)
+
+def entry_category_key(t):
+    """SQL form of category_key() over the columns of ``t`` (entry or an archive table)."""
+    return db.func.coalesce(db.func.nullif(t.c.category, ''), db.func.nullif(t.c.custom_name, ''), 'อื่นๆ')
+
+def outside_years(day, years):
+    """Conditions keeping ``day`` out of each of ``years``."""
+    return [db.or_(day < date(y, 1, 1), day >= date(y + 1, 1, 1)) for y in years]
+
+def rebuild_rollups(start=None, end=None):
+    """Recompute DailyRollup out of the Entry table, optionally only for days in [start, end).
+
+    Archived years are left alone: their entries are no longer in `entry`, and
+    their rollups stay as they were when the year was closed.
+    """
+    key = entry_category_key(Entry.__table__)
+    day = Entry.local_date
+    src = db.select(day, Entry.user_id, Entry.is_income, key, db.func.sum(Entry.amount), db.func.count(Entry.id)) \
+        .group_by(day, Entry.user_id, Entry.is_income, key)
+    t = DailyRollup.__table__
+    purge = t.delete().where(*outside_years(t.c.day, archived_years()))
+    if start is not None:
+        src = src.where(Entry.local_date >= start, Entry.local_date < end)
+        purge = purge.where(t.c.day >= start, t.c.day < end)
+    db.session.execute(purge)
+    db.session.execute(t.insert().from_select(
+        ['day', 'user_id', 'is_income', 'category_key', 'total', 'count'], src))
+    periods = {p for (p,) in db.session.query(StatsVersion.period)}
+    periods |= {d.year * 100 + d.month for (d,) in db.session.query(DailyRollup.day).distinct()}
+    if start is not None:
+        periods = {p for p in periods if start.year * 100 + start.month <= p < end.year * 100 + end.month}
+    bump_stats_versions(periods)
+    db.session.commit()
+
+def backfill_local_periods(batch_size=5000):
+    """Fill local_date/local_month/local_year on entries written before those columns existed."""
+    t = Entry.__table__
+    update = t.update().where(t.c.id == db.bindparam('b_id')).values(
+        local_date=db.bindparam('b_date'), local_month=db.bindparam('b_month'), local_year=db.bindparam('b_year'))
+    done = 0
+    while True:
+        rows = db.session.execute(db.select(t.c.id, t.c.created_at).where(t.c.local_date.is_(None))
+                                  .order_by(t.c.id).limit(batch_size)).all()
+        if not rows:
+            return done
+        params = []
+        for id_, created_at in rows:
+            p = local_period(created_at)
+            params.append({'b_id': id_, 'b_date': p['local_date'], 'b_month': p['local_month'], 'b_year': p['local_year']})
+        db.session.execute(update, params)
+        db.session.commit()
+        done += len(rows)
+
+@app.cli.command('rebuild-rollups')
+@click.option('--year', type=int, help='Only rebuild this calendar year.')
+def rebuild_rollups_command(year):
+    """Backfill the daily_rollup table from existing entries."""
+    backfill_local_periods()
+    if year:
+        rebuild_rollups(date(year, 1, 1), date(year + 1, 1, 1))
+    else:
+        rebuild_rollups()
+    print(f'{DailyRollup.query.count()} rollup rows')
+
+# Schema changes and the default admin are applied once per deploy by migrations.py,
+# not by the workers; imported only by these commands.
+@app.cli.command('db-upgrade')
+def db_upgrade_command():
+    """Apply pending schema migrations and create the default admin."""
+    import migrations
+    names = migrations.upgrade()
+    print(f'{len(names)} migration(s) applied' if names else 'database is up to date')
+
+@app.cli.command('db-status')
+def db_status_command():
+    """List applied and pending schema migrations."""
+    import migrations
+    if migrations.status():
+        raise SystemExit(1)
+
+# Yearly archives. The entries of a closed year move out of `entry` into their
+# own partition (an entry_archive_<year> table on SQLite, a partition of the
+# natively partitioned entry_archive on PostgreSQL), and the year's monthly and
+# yearly totals are frozen into PeriodSummary. Everything that works on current
+# periods keeps reading `entry` and the rollups only; export and search union
+# the archives in when asked to (?archived=1). Archived years take no writes.
+ARCHIVE_METADATA = db.MetaData()  # kept out of db.metadata so create_all() never touches the archives
+_archive_tables_lock = threading.Lock()
+
+def archive_table(year):
+    """Table with the archived entries of ``year``; on PostgreSQL the partitioned parent of every year."""
+    postgres = db.engine.dialect.name == 'postgresql'
+    name = 'entry_archive' if postgres else f'entry_archive_{year}'
+    with _archive_tables_lock:
+        if name not in ARCHIVE_METADATA.tables:
+            # a partitioned table's primary key has to include the partition column
+            columns = [db.Column(c.name, c.type, nullable=c.nullable,
+                                 primary_key=c.primary_key or (postgres and c.name == 'local_year'))
+                       for c in Entry.__table__.columns]
+            db.Table(name, ARCHIVE_METADATA, *columns,
+                     db.Index(f'ix_{name}_created_at', 'created_at', 'id'),
+                     db.Index(f'ix_{name}_user_id_created_at', 'user_id', 'created_at'),
+                     **({'postgresql_partition_by': 'RANGE (local_year)'} if postgres else {}))
+        return ARCHIVE_METADATA.tables[name]
+
+def archive_tables(years):
+    """The distinct tables holding the archived ``years``."""
+    return list({archive_table(y).name: archive_table(y) for y in years}.values())
+
+def create_archive_partition(conn, year):
+    archive_table(year).create(conn, checkfirst=True)
+    if conn.dialect.name == 'postgresql':
+        conn.execute(db.text(f'CREATE TABLE IF NOT EXISTS entry_archive_{year:d} PARTITION OF entry_archive '
+                             f'FOR VALUES FROM ({year:d}) TO ({year + 1:d})'))
+
+def drop_archive_partition(conn, year):
+    if conn.dialect.name == 'postgresql':
+        conn.execute(db.text(f'DROP TABLE IF EXISTS entry_archive_{year:d}'))
+    else:
+        archive_table(year).drop(conn, checkfirst=True)
+
+def archived_years():
+    return [y for (y,) in db.session.query(ArchivedYear.year).order_by(ArchivedYear.year)]
+
+def entry_source(years=()):
+    """`entry`, or, given archived ``years``, `entry` unioned with their archives (same columns)."""
+    t = Entry.__table__
+    if not years:
+        return t
+    names = [c.name for c in t.columns]
+    archives = [db.select(*[a.c[n] for n in names]).where(a.c.local_year.in_(years)) for a in archive_tables(years)]
+    return db.union_all(db.select(*[t.c[n] for n in names]), *archives).subquery('entry_all')
+
+def archive_year(year):
+    """Move the entries of the closed ``year`` into its partition and freeze its summaries; returns how many moved."""
+    if year >= now_thai().year:
+        raise ValueError(f'{year} is not closed yet')
+    if db.session.get(ArchivedYear, year):
+        raise ValueError(f'{year} is already archived')
+    t, archive = Entry.__table__, archive_table(year)
+    create_archive_partition(db.session.connection(), year)
+    key = entry_category_key(t)
+    for grain, period in (('month', t.c.local_month), ('year', t.c.local_year)):
+        db.session.execute(PeriodSummary.__table__.insert().from_select(
+            ['grain', 'period', 'user_id', 'is_income', 'category_key', 'total', 'count'],
+            db.select(db.literal(grain), period, t.c.user_id, t.c.is_income, key,
+                      db.func.sum(t.c.amount), db.func.count(t.c.id))
+            .where(t.c.local_year == year).group_by(period, t.c.user_id, t.c.is_income, key)))
+    names = [c.name for c in t.columns]
+    db.session.execute(archive.insert().from_select(
+        names, db.select(*[t.c[n] for n in names]).where(t.c.local_year == year)))
+    moved = db.session.execute(t.delete().where(t.c.local_year == year)).rowcount
+    db.session.add(ArchivedYear(year=year, entries=moved, archived_at=now_thai().replace(tzinfo=None)))
+    if search_index_ready() and db.engine.dialect.name in SEARCH_OPTIMIZE:
+        db.session.execute(db.text(SEARCH_OPTIMIZE[db.engine.dialect.name]))
+    db.session.commit()
+    return moved
+
+def restore_year(year):
+    """Move an archived year's entries back into `entry` (e.g. to correct them) and drop its frozen summaries."""
+    if not db.session.get(ArchivedYear, year):
+        raise ValueError(f'{year} is not archived')
+    t, archive = Entry.__table__, archive_table(year)
+    names = [c.name for c in t.columns]
+    rows = db.select(*[archive.c[n] for n in names]).where(archive.c.local_year == year)
+    # SQLite hands out max(id) + 1, so a newer entry may have taken the id of an archived one
+    taken = [i for (i,) in db.session.execute(
+        db.select(t.c.id).where(t.c.id.in_(db.select(archive.c.id).where(archive.c.local_year == year))))]
+    db.session.execute(t.insert().from_select(names, rows.where(archive.c.id.not_in(taken))))
+    if taken:
+        others = [n for n in names if n != 'id']
+        db.session.execute(t.insert().from_select(others, rows.with_only_columns(
+            *[archive.c[n] for n in others]).where(archive.c.id.in_(taken))))
+    moved = db.session.execute(archive.delete().where(archive.c.local_year == year)).rowcount
+    drop_archive_partition(db.session.connection(), year)
+    PeriodSummary.query.filter(db.or_(
+        db.and_(PeriodSummary.grain == 'year', PeriodSummary.period == year),
+        db.and_(PeriodSummary.grain == 'month', PeriodSummary.period.between(year * 100 + 1, year * 100 + 12)),
+    )).delete(synchronize_session=False)
+    ArchivedYear.query.filter_by(year=year).delete()
+    db.session.commit()
+    return moved
+
+def delete_archived_entries(user_id):
+    """Drop ``user_id``'s rows out of every archived year (entries, frozen summaries, rollups); returns how many entries."""
+    years = archived_years()
+    if not years:
+        return 0
+    deleted = sum(db.session.execute(archive.delete().where(archive.c.user_id == user_id)).rowcount
+                  for archive in archive_tables(years))
+    PeriodSummary.query.filter_by(user_id=user_id).delete()
+    archived = db.not_(db.and_(*outside_years(DailyRollup.day, years)))
+    periods = {d.year * 100 + d.month for (d,) in db.session.query(DailyRollup.day).filter(
+        DailyRollup.user_id == user_id, archived).distinct()}
+    DailyRollup.query.filter(DailyRollup.user_id == user_id, archived).delete(synchronize_session=False)
+    bump_stats_versions(periods)
+    return deleted
+
+@app.cli.command('archive-year')
+@click.argument('years', type=int, nargs=-1)
+def archive_year_command(years):
+    """Archive the entries of closed YEARS; without arguments, list the archived years."""
+    for year in years:
+        try:
+            print(f'{year}: archived {archive_year(year)} entries')
+        except ValueError as ex:
+            db.session.rollback()
+            raise click.ClickException(str(ex))
+    if not years:
+        for a in ArchivedYear.query.order_by(ArchivedYear.year):
+            print(f'{a.year}  {a.entries} entries  archived {a.archived_at:%Y-%m-%d %H:%M}')
+
+@app.cli.command('restore-year')
+@click.argument('year', type=int)
+def restore_year_command(year):
+    """Move an archived YEAR back into the live entry table."""
+    try:
+        print(f'{year}: restored {restore_year(year)} entries')
+    except ValueError as ex:
+        db.session.rollback()
+        raise click.ClickException(str(ex))
+
+def month_days(year, month):
+    """Half-open [first day, first day of next month) date range."""
+    start = date(year, month, 1)
+    end = date(year + 1, 1, 1) if month == 12 else date(year, month + 1, 1)
+    return start, end
+
+# The stats are built as a (statement, shape rows) pair so the async endpoints in
+# asgi.py can run the same queries on their own engine.
+
+def monthly_stats_query(month, year):
+    start, end = month_days(year, month)
+    return db.select(DailyRollup.is_income, db.func.sum(DailyRollup.total)).where(
+        DailyRollup.day >= start, DailyRollup.day < end
+    ).group_by(DailyRollup.is_income)
+
+def monthly_stats_from_rows(rows):
+    totals = {bool(is_income): amount or 0 for is_income, amount in rows}
+    income = totals.get(True, 0)
+    expense = totals.get(False, 0)
     balance = income - expense
-    
     return {'income': income, 'expense': expense, 'balance': balance}
 
+def dashboard_stats_query(month, year):
+    """Everything the dashboard shows, as one grouped query over the rollups.
+
+    Per kind and category: the selected month's total and count, and the signed
+    (income - expense) totals of today, this month and this year.
+    """
+    bounds = {k: (a.date(), b.date()) for k, (a, b) in period_bounds(now_thai().date()).items()}
+    m_start, m_end = month_days(year, month)
+    signed = db.case((DailyRollup.is_income, DailyRollup.total), else_=-DailyRollup.total)
+
+    def window(start, end, value):
+        in_window = db.and_(DailyRollup.day >= start, DailyRollup.day < end)
+        return db.func.coalesce(db.func.sum(db.case((in_window, value), else_=0)), 0)
+
+    y_start, y_end = bounds['yearly']
+    return db.select(
+        DailyRollup.is_income, DailyRollup.category_key,
+        window(m_start, m_end, DailyRollup.total), window(m_start, m_end, DailyRollup.count),
+        window(*bounds['daily'], signed), window(*bounds['monthly'], signed), window(*bounds['yearly'], signed),
+    ).where(db.or_(db.and_(DailyRollup.day >= y_start, DailyRollup.day < y_end),
+                   db.and_(DailyRollup.day >= m_start, DailyRollup.day < m_end))
+    ).group_by(DailyRollup.is_income, DailyRollup.category_key).order_by(DailyRollup.category_key)
+
+def dashboard_stats_from_rows(month, year, rows):
+    sums = {'daily': 0, 'monthly': 0, 'yearly': 0}
+    totals = {'income': 0, 'expense': 0}
+    categories = {'income': {'labels': [], 'values': []}, 'expense': {'labels': [], 'values': []}}
+    for is_income, key, month_total, month_count, daily, monthly, yearly in rows:
+        sums['daily'] += daily
+        sums['monthly'] += monthly
+        sums['yearly'] += yearly
+        if month_count:
+            kind = 'income' if is_income else 'expense'
+            totals[kind] += month_total
+            categories[kind]['labels'].append(key)
+            categories[kind]['values'].append(month_total)
+    return {
+        'sums': sums,
+        'month': {'month': month, 'year': year, 'income': totals['income'], 'expense': totals['expense'],
+                  'balance': totals['income'] - totals['expense']},
+        'categories': categories,
+    }
+
 # Routes
 @app.route('/')
 def index():
@@ -171,14 +1090,29 @@ def login():
     if request.method == 'POST':
         username = request.form['username']
         password = request.form['password']
+        # refuse floods before touching the database or hashing anything
+        wait = login_backoff.wait(username)
+        if wait or not login_limiter.hit(request.remote_addr, app.config['LOGIN_IP_RATE_LIMIT']):
+            flash('พยายามเข้าสู่ระบบบ่อยเกินไป กรุณารอสักครู่แล้วลองใหม่')
+            return render_template('login.html'), 429, {'Retry-After': str(math.ceil(wait or 1))}
         u = User.query.filter_by(username=username).first()
         if u and u.check_password(password):
+            login_backoff.reset(username)
+            if password_needs_rehash(u.password_hash):
+                u.set_password(password)
+                bump_user_version()
+                db.session.commit()
             login_user(u)
             return redirect(url_for('dashboard'))
+        login_backoff.fail(username)
         flash('ชื่อผู้ใช้หรือรหัสผ่านไม่ถูกต้อง')
         return redirect(url_for('login'))
     return render_template('login.html')
 
+@app.errorhandler(PasswordHashBusy)
+def password_hash_busy(e):
+    return 'ระบบกำลังยุ่ง กรุณาลองใหม่อีกครั้ง', 503, {'Retry-After': '1'}
+
 @app.route('/logout')
 @login_required
 def logout():
@@ -192,29 +1126,34 @@ def dashboard():
     sel_year = request.args.get('year')
     # default to current Thai time
     now = now_thai()
-    month = int(sel_month) if sel_month and sel_month.isdigit() else now.month
+    month = int(sel_month) if sel_month and sel_month.isdigit() and 1 <= int(sel_month) <= 12 else now.month
     year = int(sel_year) if sel_year and sel_year.isdigit() else now.year
 
-    # totals (show across all users)
-    sums = summarize()
+    # totals (show across all users) and the selected month's summary, in one query, cached per StatsVersion
+    stats = cached_stats('dashboard-stats', None, month, year, stats_version('dashboard-stats', month, year)[0])
 
-    # prepare last 10 entries
-    page = int(request.args.get('page', 1))
+    # prepare last 10 entries, seeking on (created_at, id) so deep pages cost the same as the first
     per_page = 10
     # list all entries (all users) — users can view all but may only edit/delete their own unless admin
-    q = Entry.query.order_by(Entry.created_at.desc())
-    # search support
-    q_text = request.args.get('q')
+    q, keys = Entry.query, [Entry.created_at, Entry.id]
+    # ?archived=1 lists/searches the archived years too; otherwise only `entry` is read
+    archived = request.args.get('archived') == '1'
+    years = archived_years() if archived else []
+    if years:
+        e = db.aliased(Entry, entry_source(years))
+        q, keys = db.session.query(e), [e.created_at, e.id]
+    # search support (ranked by relevance when a search index is available)
+    q_text = (request.args.get('q') or '').strip()
     if q_text:
-        q = q.filter((Entry.category.ilike(f'%{q_text}%')) | (Entry.custom_name.ilike(f'%{q_text}%')) | (Entry.notes.ilike(f'%{q_text}%')))
-    pagination = q.paginate(page=page, per_page=per_page, error_out=False)
+        q, keys = search_entries(q_text, years)
+    pagination = keyset_paginate(q, keys, request.args.get('cursor'), per_page)
+
+    jobs = Job.query.filter_by(user_id=current_user.id).order_by(Job.id.desc()).limit(5).all()
 
-    # Get monthly statistics
-    monthly_stats = get_monthly_stats(month=month, year=year)
-    
     return render_template('dashboard.html', income_lookup=INCOME_LOOKUP, expense_lookup=EXPENSE_LOOKUP,
-                           pagination=pagination, sums=sums, month=month, year=year, q=q_text,
-                           monthly_stats=monthly_stats)
+                           pagination=pagination, sums=stats['sums'], month=month, year=year, q=q_text or None,
+                           monthly_stats=stats['month'], jobs=jobs, archived='1' if archived else None,
+                           archived_years=set(years))
 
 @app.route('/add-entry', methods=['POST'])
 @login_required
@@ -232,9 +1171,13 @@ def add_entry():
     if not category and not custom_name:
         flash('กรุณาเลือกหรือพิมพ์ชื่อรายการ')
         return redirect(url_for('dashboard'))
-    # store created_at using Thailand timezone so display matches DB saved value
-    e = Entry(user_id=current_user.id, is_income=is_income, category=category, custom_name=custom_name, amount=amount, notes=notes, created_at=now_thai())
+    # created_at is stored as Thai wall-clock time so display matches DB saved value
+    e = Entry(user_id=current_user.id, is_income=is_income, category=category, custom_name=custom_name, amount=amount, notes=notes)
+    e.set_created_at(now_thai())
     db.session.add(e)
+    deltas = {}
+    track_rollup(deltas, e)
+    apply_rollups(deltas)
     db.session.commit()
     flash('บันทึกรายการเรียบร้อย')
     return redirect(url_for('dashboard'))
@@ -247,6 +1190,8 @@ def edit(entry_id):
         flash('ไม่มีสิทธิ์แก้ไข')
         return redirect(url_for('dashboard'))
     if request.method == 'POST':
+        deltas = {}
+        track_rollup(deltas, e, -1)
         e.is_income = True if request.form.get('kind') == 'income' else False
         e.category = request.form.get('category') or None
         e.custom_name = request.form.get('custom_name') or None
@@ -262,17 +1207,18 @@ def edit(entry_id):
             entry_date = request.form.get('entry_date')
             entry_time = request.form.get('entry_time', '00:00')
             datetime_str = f"{entry_date} {entry_time}"
-            # Parse input and store as Thailand timezone-aware datetime
-            parsed = datetime.strptime(datetime_str, '%Y-%m-%d %H:%M')
-            if parsed.tzinfo is None:
-                created_at = TH_TZ.localize(parsed)
-            else:
-                created_at = parsed.astimezone(TH_TZ)
-            e.created_at = created_at
+            # the form gives Thai wall-clock time, which is how created_at is stored
+            created_at = datetime.strptime(datetime_str, '%Y-%m-%d %H:%M')
         except (ValueError, TypeError):
             flash('รูปแบบวันที่หรือเวลาไม่ถูกต้อง')
             return redirect(url_for('edit', entry_id=entry_id))
-            
+        if created_at.year in archived_years():
+            flash(f'ปี {created_at.year} ถูกเก็บถาวรแล้ว ไม่สามารถย้ายรายการไปปีนั้นได้')
+            return redirect(url_for('edit', entry_id=entry_id))
+        e.set_created_at(created_at)
+
+        track_rollup(deltas, e)
+        apply_rollups(deltas)
         db.session.commit()
         flash('แก้ไขเรียบร้อย')
         return redirect(url_for('dashboard'))
@@ -285,6 +1231,9 @@ def delete(entry_id):
     if e.user_id != current_user.id and not current_user.is_admin:
         flash('ไม่มีสิทธิ์ลบ')
         return redirect(url_for('dashboard'))
+    deltas = {}
+    track_rollup(deltas, e, -1)
+    apply_rollups(deltas)
     db.session.delete(e)
     db.session.commit()
     flash('ลบเรียบร้อย')
@@ -293,50 +1242,197 @@ def delete(entry_id):
 @app.route('/delete-all', methods=['POST'])
 @login_required
 def delete_all():
-    # delete all entries for current user
-    Entry.query.filter_by(user_id=current_user.id).delete()
-    db.session.commit()
-    flash('ลบรายการทั้งหมดเรียบร้อย')
-    return redirect(url_for('dashboard'))
+    # delete all entries for current user, in the background
+    job = enqueue_job('delete_entries', current_user.id, {'target_user_id': current_user.id})
+    return job_started(job, 'กำลังลบรายการทั้งหมด')
+
+EXPORT_COLUMNS = ['id', 'is_income', 'category', 'custom_name', 'amount', 'notes', 'created_at']
+EXPORT_BATCH = 2000
+
+def export_filters(args):
+    """Parse optional ?start=YYYY-MM-DD&end=YYYY-MM-DD (inclusive), ?user_id= and ?archived=1 filters.
+
+    Returns a half-open [start, end) range of Thai-local dates. Raises ValueError on malformed values.
+    """
+    filters = {'archived': args.get('archived') == '1'}
+    if args.get('start'):
+        filters['start'] = date.fromisoformat(args['start'])
+    if args.get('end'):
+        filters['end'] = date.fromisoformat(args['end']) + timedelta(days=1)
+    if args.get('user_id'):
+        filters['user_id'] = int(args['user_id'])
+    return filters
+
+def export_source(start=None, end=None, user_id=None, archived=False):
+    """``(table, where clauses)`` for an export; ``archived`` unions in the archived years the range touches."""
+    years = [y for y in archived_years() if (start is None or y >= start.year)
+             and (end is None or date(y, 1, 1) < end)] if archived else []
+    t = entry_source(years)
+    where = []
+    if start is not None:
+        where.append(t.c.local_date >= start)
+    if end is not None:
+        where.append(t.c.local_date < end)
+    if user_id is not None:
+        where.append(t.c.user_id == user_id)
+    return t, where
+
+def export_batch(t, where, after=None):
+    """Statement for one export batch: the next EXPORT_BATCH rows of ``t`` after ``after`` = (created_at, id)."""
+    if after is not None:
+        where = [*where, db.tuple_(t.c.created_at, t.c.id) > db.tuple_(*after)]
+    return db.select(t.c.id, t.c.is_income, t.c.category, t.c.custom_name, t.c.amount, t.c.notes,
+                     t.c.created_at).where(*where).order_by(t.c.created_at.asc(), t.c.id.asc()).limit(EXPORT_BATCH)
+
+def iter_export_csv(start=None, end=None, user_id=None, archived=False, bom=True, on_batch=None):
+    """Yield the export as UTF-8 CSV chunks, one per batch of EXPORT_BATCH rows.
+
+    Each batch is its own keyset query on (created_at, id), so memory stays flat
+    and no cursor stays open between batches: the export job can commit progress
+    as it goes, and SQLite writers are not locked out for the whole export.
+    ``on_batch(n)`` is called with the size of each batch written.
+    """
+    if bom:
+        yield '\ufeff'.encode('utf-8')
+    si = StringIO()
+    cw = csv.writer(si)
+    cw.writerow(EXPORT_COLUMNS)
+    t, where = export_source(start, end, user_id, archived)
+    last = None
+    while True:
+        batch = db.session.execute(export_batch(t, where, last)).all()
+        if not batch:
+            break
+        for id_, is_income, category, custom_name, amount, notes, created_at in batch:
+            cw.writerow([id_, is_income, category or '', custom_name or '', amount, notes or '', created_at.isoformat()])
+        last = (batch[-1].created_at, batch[-1].id)
+        yield si.getvalue().encode('utf-8')
+        si.seek(0)
+        si.truncate()
+        if on_batch:
+            on_batch(len(batch))
+    yield si.getvalue().encode('utf-8')
 
 @app.route('/export-csv')
 @login_required
 def export_csv():
+    # export all entries (across users), optionally narrowed by date range / user; built by a job
+    args = {k: request.args[k] for k in ('start', 'end', 'user_id', 'archived') if request.args.get(k)}
     try:
-        # Build CSV in text, then encode to bytes to avoid TextIOWrapper/BytesIO issues
-        si = StringIO()
-        cw = csv.writer(si)
-        cw.writerow(['id', 'is_income', 'category', 'custom_name', 'amount', 'notes', 'created_at'])
-        # export all entries (across users)
-        entries = Entry.query.order_by(Entry.created_at.asc()).all()
-        for e in entries:
-            cw.writerow([e.id, e.is_income, e.category or '', e.custom_name or '', e.amount, e.notes or '', e.created_at.isoformat()])
-        text = si.getvalue()
-        # Encode with BOM for better Excel compatibility (optional)
-        data = text.encode('utf-8-sig')
-        bio = io.BytesIO(data)
-        bio.seek(0)
-        return send_file(bio, mimetype='text/csv; charset=utf-8', as_attachment=True, download_name='entries.csv')
-    except Exception:
-        import traceback
-        traceback.print_exc()
-        flash('เกิดข้อผิดพลาดขณะส่งออก CSV')
+        export_filters(args)
+    except ValueError:
+        flash('รูปแบบวันที่หรือผู้ใช้ไม่ถูกต้อง')
         return redirect(url_for('dashboard'))
+    job = enqueue_job('export', current_user.id, args)
+    return job_started(job, 'กำลังสร้างไฟล์ CSV')
 
 
 @app.route('/export-csv-debug')
 @login_required
 def export_csv_debug():
     """Return CSV as plain text in the browser (no attachment) to help debug encoding/IO issues."""
-    si = StringIO()
-    cw = csv.writer(si)
-    cw.writerow(['id', 'is_income', 'category', 'custom_name', 'amount', 'notes', 'created_at'])
-    # debug: show all entries
-    entries = Entry.query.order_by(Entry.created_at.asc()).all()
-    for e in entries:
-        cw.writerow([e.id, e.is_income, e.category or '', e.custom_name or '', e.amount, e.notes or '', e.created_at.isoformat()])
-    text = si.getvalue()
-    return text, 200, {'Content-Type': 'text/csv; charset=utf-8'}
+    try:
+        filters = export_filters(request.args)
+    except ValueError:
+        return 'invalid start/end/user_id', 400
+    return Response(stream_with_context(iter_export_csv(bom=False, **filters)),
+                    content_type='text/csv; charset=utf-8')
+
+IMPORT_CHUNK = 5000
+IMPORT_REPORT_LIMIT = 200  # rejected rows listed in the report; the rest are only counted
+
+@lru_cache(maxsize=4096)
+def th_utcoffset(day):
+    """Bangkok's UTC offset on ``day`` (pytz localisation is slow, imports repeat days a lot)."""
+    return TH_TZ.localize(datetime.combine(day, time(12))).utcoffset()
+
+def parse_created_at(raw):
+    """Parse an ISO timestamp from CSV into naive Thai wall-clock time, as created_at is stored.
+
+    Naive values are taken as Thai time already; aware ones are converted.
+    Returns None for missing or unparseable values.
+    """
+    if not raw:
+        return None
+    try:
+        parsed = datetime.fromisoformat(raw)
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        return parsed
+    utc = parsed.replace(tzinfo=None) - parsed.utcoffset()
+    return utc + th_utcoffset(utc.date())
+
+def parse_import_row(row, user_id, now, archived=()):
+    """Validate one CSV row and return the Entry column values; raises ValueError with a reason."""
+    try:
+        amount = float(row.get('amount') or 0)
+    except ValueError:
+        raise ValueError(f"invalid amount {row.get('amount')!r}")
+    if not math.isfinite(amount):
+        raise ValueError(f"invalid amount {row.get('amount')!r}")
+    # missing/invalid created_at falls back to the import time
+    created_at = parse_created_at(row.get('created_at')) or now
+    if created_at.year in archived:
+        raise ValueError(f'year {created_at.year} is archived')
+    return {
+        'user_id': user_id,
+        'is_income': (row.get('is_income') or '').lower() in ('1', 'true', 'yes'),
+        'category': row.get('category') or None,
+        'custom_name': row.get('custom_name') or None,
+        'amount': amount,
+        'notes': row.get('notes'),
+        **Entry.created_at_columns(created_at),
+    }
+
+def import_entries(stream, user_id, chunk_size=IMPORT_CHUNK, on_chunk=None):
+    """Import CSV rows from a binary ``stream`` for ``user_id``.
+
+    The upload is decoded incrementally and inserted with executemany in
+    transactions of ``chunk_size`` rows (rollups updated alongside), so neither
+    memory nor transaction size grows with the file. Returns a report dict;
+    ``on_chunk(report)`` is called after each committed chunk.
+    """
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    reader = csv.DictReader(text)
+    now = now_thai().replace(tzinfo=None)
+    report = {'accepted': 0, 'rejected': 0, 'errors': []}
+    insert = Entry.__table__.insert()
+    archived = set(archived_years())
+
+    def flush(rows, deltas):
+        if rows:
+            db.session.execute(insert, rows)
+            apply_rollups(deltas)
+            db.session.commit()
+            report['accepted'] += len(rows)
+            if on_chunk:
+                on_chunk(report)
+
+    rows, deltas = [], {}
+    try:
+        for row in reader:
+            try:
+                values = parse_import_row(row, user_id, now, archived)
+            except ValueError as ex:
+                report['rejected'] += 1
+                if len(report['errors']) < IMPORT_REPORT_LIMIT:
+                    report['errors'].append({'line': reader.line_num, 'reason': str(ex)})
+                continue
+            rows.append(values)
+            add_rollup_delta(deltas, (values['local_date'], user_id, values['is_income'],
+                                      category_key(values['category'], values['custom_name'])), values['amount'])
+            if len(rows) >= chunk_size:
+                flush(rows, deltas)
+                rows, deltas = [], {}
+        flush(rows, deltas)
+    except (UnicodeDecodeError, csv.Error) as ex:
+        db.session.rollback()
+        report['errors'].append({'line': reader.line_num, 'reason': f'unreadable file: {ex}'})
+        report['aborted'] = True
+    finally:
+        text.detach()
+    return report
 
 @app.route('/import-csv', methods=['GET', 'POST'])
 @login_required
@@ -346,39 +1442,257 @@ def import_csv():
         if not f:
             flash('โปรดเลือกไฟล์')
             return redirect(url_for('dashboard'))
-        data = f.stream.read().decode('utf-8')
-        reader = csv.DictReader(StringIO(data))
-        count = 0
-        for row in reader:
+        # spool the upload to disk; the job streams it from there after this request returns
+        path = job_file(f'import-{uuid.uuid4().hex}.csv')
+        f.save(path)
+        job = enqueue_job('import', current_user.id, {'path': path})
+        return job_started(job, 'กำลังนำเข้าไฟล์')
+    return redirect(url_for('dashboard'))
+
+# Background jobs: a per-process thread pool, with state in the Job table so any
+# worker can answer status requests. No external broker is needed.
+JOBS_DIR = os.environ.get('JOBS_DIR', os.path.join(BASE_DIR, 'jobs'))
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 2))
+JOB_RETENTION = timedelta(days=1)
+JOB_PURGE_INTERVAL = int(os.environ.get('JOB_PURGE_INTERVAL', 3600))  # seconds between purges per process
+DELETE_BATCH = 2000
+_job_executor = None
+_job_executor_lock = threading.Lock()
+_last_job_purge = None
+
+def job_file(name):
+    os.makedirs(JOBS_DIR, exist_ok=True)
+    return os.path.join(JOBS_DIR, name)
+
+def worker_id():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+def job_executor():
+    # created lazily so each gunicorn worker gets its own pool after forking
+    global _job_executor
+    with _job_executor_lock:
+        if _job_executor is None:
+            _job_executor = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix='job')
+    return _job_executor
+
+def enqueue_job(kind, user_id, params):
+    """Record a job owned by ``user_id`` and hand it to the pool; returns the committed Job.
+
+    ``params`` is passed to the handler as keyword arguments.
+    """
+    job = Job(kind=kind, user_id=user_id, params=json.dumps(params), worker=worker_id())
+    db.session.add(job)
+    db.session.commit()
+    job_executor().submit(run_job, job.id)
+    return job
+
+def job_started(job, message):
+    if request.args.get('format') == 'json':
+        return jsonify(job.to_dict()), 202
+    flash(f'{message} (งาน #{job.id})')
+    return redirect(request.referrer or url_for('dashboard'))
+
+def report_progress(job, progress, total=None):
+    job.progress = progress
+    if total is not None:
+        job.total = total
+    db.session.commit()
+
+def run_job(job_id):
+    with app.app_context():
+        job = Job.query.get(job_id)
+        job.status = 'running'
+        job.worker = worker_id()
+        db.session.commit()
+        try:
+            result = JOB_HANDLERS[job.kind](job, **json.loads(job.params))
+            job.status = 'done'
+            job.result = json.dumps(result)
+        except Exception as ex:
+            app.logger.exception('job %s (%s) failed', job_id, job.kind)
+            db.session.rollback()
+            job = Job.query.get(job_id)
+            job.status = 'failed'
+            job.error = str(ex)[:500]
+        job.finished_at = now_thai()
+        db.session.commit()
+        # housekeeping stays on the pool thread, after the job, instead of on every enqueue
+        if purge_due():
             try:
-                is_income = row.get('is_income','').lower() in ('1','true','yes')
-                cat = row.get('category') or None
-                custom = row.get('custom_name') or None
-                amount = float(row.get('amount') or 0)
-                # parse created_at from CSV; if naive, localize to Thailand tz; if missing/invalid, use now_thai()
-                raw_created = row.get('created_at')
-                if raw_created:
-                    try:
-                        parsed = datetime.fromisoformat(raw_created)
-                        if parsed.tzinfo is None:
-                            created_at = TH_TZ.localize(parsed)
-                        else:
-                            created_at = parsed.astimezone(TH_TZ)
-                    except Exception:
-                        created_at = now_thai()
-                else:
-                    created_at = now_thai()
-
-                e = Entry(user_id=current_user.id, is_income=is_income, category=cat, custom_name=custom, amount=amount, notes=row.get('notes'), created_at=created_at)
-                db.session.add(e)
-                count += 1
-            except Exception as ex:
-                print('skip row', ex)
-                continue
+                purge_old_jobs()
+            except Exception:
+                app.logger.exception('purging old jobs failed')
+                db.session.rollback()
+
+def purge_due():
+    """True at most once per JOB_PURGE_INTERVAL in this process (and on its first finished job)."""
+    global _last_job_purge
+    now = monotonic()
+    with _job_executor_lock:
+        if _last_job_purge is not None and now - _last_job_purge < JOB_PURGE_INTERVAL:
+            return False
+        _last_job_purge = now
+    return True
+
+def check_stale(job):
+    """Fail a job whose worker process on this host has died (e.g. a gunicorn restart)."""
+    if job.status not in ('queued', 'running') or not job.worker:
+        return
+    host, _, pid = job.worker.rpartition(':')
+    if host != socket.gethostname():
+        return
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        job.status = 'failed'
+        job.error = 'worker exited before the job finished'
+        job.finished_at = now_thai()
         db.session.commit()
-        flash(f'นำเข้า {count} รายการ')
-        return redirect(url_for('dashboard'))
-    return redirect(url_for('dashboard'))
+    except (OSError, ValueError):
+        pass
+
+def remove_artifact(job):
+    if job.artifact and os.path.exists(job.artifact):
+        os.remove(job.artifact)
+
+def purge_old_jobs():
+    # jobs finished more than JOB_RETENTION ago, with their files
+    cutoff = now_thai() - JOB_RETENTION
+    old = Job.query.filter(Job.finished_at < cutoff).all()
+    for job in old:
+        remove_artifact(job)
+        db.session.delete(job)
+    if old:
+        db.session.commit()
+
+def import_job(job, path):
+    try:
+        with open(path, 'rb') as fh:
+            report = import_entries(fh, job.user_id,
+                                    on_chunk=lambda r: report_progress(job, r['accepted'] + r['rejected']))
+    finally:
+        os.remove(path)
+    for err in report['errors']:
+        app.logger.info('import job %s skip line %s: %s', job.id, err['line'], err['reason'])
+    report_progress(job, report['accepted'] + report['rejected'])
+    return report
+
+def export_job(job, **args):
+    filters = export_filters(args)
+    t, where = export_source(**filters)
+    report_progress(job, 0, db.session.scalar(db.select(db.func.count()).select_from(t).where(*where)))
+    done = 0
+
+    def on_batch(n):
+        nonlocal done
+        done += n
+        report_progress(job, done)
+
+    path = job_file(f'export-{job.id}.csv')
+    with open(path, 'wb') as fh:
+        for chunk in iter_export_csv(on_batch=on_batch, **filters):
+            fh.write(chunk)
+    job.artifact = path
+    return {'rows': done}
+
+def delete_entries_job(job, target_user_id, delete_user=False):
+    """Delete a user's entries, archived years included, in bounded batches, keeping rollups consistent after every commit."""
+    archived = sum(db.session.scalar(db.select(db.func.count()).select_from(archive)
+                                     .where(archive.c.user_id == target_user_id))
+                   for archive in archive_tables(archived_years()))
+    report_progress(job, 0, Entry.query.filter_by(user_id=target_user_id).count() + archived)
+    done = delete_archived_entries(target_user_id)
+    report_progress(job, done)
+    while True:
+        batch = Entry.query.filter_by(user_id=target_user_id).order_by(Entry.id).limit(DELETE_BATCH).all()
+        if not batch:
+            break
+        deltas = {}
+        for e in batch:
+            track_rollup(deltas, e, -1)
+        Entry.query.filter(Entry.id.in_([e.id for e in batch])).delete(synchronize_session=False)
+        apply_rollups(deltas)
+        done += len(batch)
+        report_progress(job, done)
+    if delete_user:
+        for other in Job.query.filter(Job.user_id == target_user_id).all():
+            remove_artifact(other)
+            db.session.delete(other)
+        DailyRollup.query.filter_by(user_id=target_user_id).delete()
+        u = User.query.get(target_user_id)
+        if u:
+            db.session.delete(u)
+        bump_user_version()
+        db.session.commit()
+    return {'deleted': done}
+
+JOB_HANDLERS = {
+    'import': import_job,
+    'export': export_job,
+    'delete_entries': delete_entries_job,
+}
+
+def get_job_or_404(job_id):
+    job = Job.query.get_or_404(job_id)
+    if job.user_id != current_user.id and not current_user.is_admin:
+        abort(404)
+    check_stale(job)
+    return job
+
+@app.route('/jobs')
+@login_required
+def jobs():
+    recent = Job.query.filter_by(user_id=current_user.id).order_by(Job.id.desc()).limit(20).all()
+    for job in recent:
+        check_stale(job)
+    return jsonify([job.to_dict() for job in recent])
+
+@app.route('/jobs/<int:job_id>')
+@login_required
+def job_status(job_id):
+    return jsonify(get_job_or_404(job_id).to_dict())
+
+@app.route('/jobs/<int:job_id>/download')
+@login_required
+def job_download(job_id):
+    job = get_job_or_404(job_id)
+    if job.status != 'done' or not job.artifact or not os.path.exists(job.artifact):
+        abort(404)
+    return send_file(job.artifact, mimetype='text/csv', as_attachment=True, download_name='entries.csv')
+
+ADMIN_PER_PAGE = 50
+
+def user_overview(user_ids):
+    """Entry count, income, expense and last entry time per user, from one grouped query.
+
+    Counts and sums come from the rollups, archived years included; the last
+    entry time is a per-user max(created_at), answered from
+    ix_entry_user_id_created_at, falling back to the newest archive holding
+    rows of users with nothing left in `entry`.
+    """
+    last_entry = db.select(db.func.max(Entry.created_at)).where(
+        Entry.user_id == DailyRollup.user_id).correlate(DailyRollup).scalar_subquery()
+    rows = db.session.execute(db.select(
+        DailyRollup.user_id,
+        db.func.sum(DailyRollup.count),
+        db.func.sum(db.case((DailyRollup.is_income, DailyRollup.total), else_=0)),
+        db.func.sum(db.case((DailyRollup.is_income, 0), else_=DailyRollup.total)),
+        last_entry,
+    ).where(DailyRollup.user_id.in_(user_ids)).group_by(DailyRollup.user_id)).all()
+    overview = {uid: {'entries': 0, 'income': 0, 'expense': 0, 'last_entry': None} for uid in user_ids}
+    for user_id, count, income, expense, last in rows:
+        overview[user_id] = {'entries': count or 0, 'income': income or 0, 'expense': expense or 0,
+                             'last_entry': last}
+    missing = {uid for uid, o in overview.items() if o['entries'] and not o['last_entry']}
+    for archive in reversed(archive_tables(archived_years()) if missing else []):
+        for user_id, last in db.session.execute(
+                db.select(archive.c.user_id, db.func.max(archive.c.created_at))
+                .where(archive.c.user_id.in_(missing)).group_by(archive.c.user_id)):
+            overview[user_id]['last_entry'] = last
+            missing.discard(user_id)
+        if not missing:
+            break
+    return overview
 
 @app.route('/admin')
 @login_required
@@ -386,8 +1700,10 @@ def admin():
     if not current_user.is_admin:
         flash('ต้องเป็นผู้ดูแลระบบ')
         return redirect(url_for('dashboard'))
-    users = User.query.order_by(User.username).all()
-    return render_template('admin.html', users=users)
+    pagination = keyset_paginate(User.query, [User.username, User.id], request.args.get('cursor'),
+                                 ADMIN_PER_PAGE, descending=False)
+    overview = user_overview([u.id for u in pagination.items])
+    return render_template('admin.html', users=pagination.items, pagination=pagination, overview=overview)
 
 @app.route('/admin/delete-user/<int:user_id>', methods=['POST'])
 @login_required
@@ -399,11 +1715,8 @@ def admin_delete_user(user_id):
     if u.username == 'admin':
         flash('ไม่สามารถลบ admin หลักได้')
         return redirect(url_for('admin'))
-    Entry.query.filter_by(user_id=u.id).delete()
-    db.session.delete(u)
-    db.session.commit()
-    flash('ลบสมาชิกเรียบร้อย')
-    return redirect(url_for('admin'))
+    job = enqueue_job('delete_entries', current_user.id, {'target_user_id': u.id, 'delete_user': True})
+    return job_started(job, 'กำลังลบสมาชิก')
 
 
 @app.route('/admin/create-user', methods=['POST'])
@@ -440,6 +1753,7 @@ def admin_toggle_admin(user_id):
         flash('ไม่สามารถเปลี่ยนสิทธิ์ admin หลักได้')
         return redirect(url_for('admin'))
     u.is_admin = not u.is_admin
+    bump_user_version()
     db.session.commit()
     flash('ปรับสิทธิ์เรียบร้อย')
     return redirect(url_for('admin'))
@@ -460,6 +1774,7 @@ def admin_reset_password(user_id):
         flash('กรุณากรอกรหัสผ่านใหม่')
         return redirect(url_for('admin'))
     u.set_password(new_pw)
+    bump_user_version()
     db.session.commit()
     flash('รีเซ็ตรหัสผ่านเรียบร้อย')
     return redirect(url_for('admin'))
@@ -479,35 +1794,228 @@ def change_password():
         flash('รหัสผ่านปัจจุบันไม่ถูกต้อง')
         return redirect(url_for('admin'))
     user.set_password(new_pw)
+    bump_user_version()
     db.session.commit()
     flash('เปลี่ยนรหัสผ่านเรียบร้อย')
     return redirect(url_for('admin'))
 
+def chart_query(kind, month, year):
+    # pie chart data for the month, entries from all users, grouped by category
+    is_income = True if kind == 'income' else False
+    start, end = month_days(year, month)
+    return db.select(DailyRollup.category_key, db.func.sum(DailyRollup.total)).where(
+        DailyRollup.is_income == is_income, DailyRollup.day >= start, DailyRollup.day < end
+    ).group_by(DailyRollup.category_key).order_by(DailyRollup.category_key)
+
+def chart_from_rows(rows):
+    sums = {key: total for key, total in rows}
+    labels = list(sums.keys())
+    values = [sums[k] for k in labels]
+    return {'labels': labels, 'values': values}
+
+# endpoint -> (statement for (kind, month, year), (rows, kind, month, year) -> payload)
+STATS_COMPUTE = {
+    'monthly-stats': (lambda kind, month, year: monthly_stats_query(month, year),
+                      lambda rows, kind, month, year: monthly_stats_from_rows(rows)),
+    'chart-data': (chart_query, lambda rows, kind, month, year: chart_from_rows(rows)),
+    'dashboard-stats': (lambda kind, month, year: dashboard_stats_query(month, year),
+                        lambda rows, kind, month, year: dashboard_stats_from_rows(month, year, rows)),
+}
+
+def stats_periods(endpoint, month, year):
+    """YYYYMM periods whose rollups the endpoint's payload for a month is computed from."""
+    periods = {year * 100 + month}
+    if endpoint == 'dashboard-stats':
+        # plus the daily/monthly/yearly sums, which cover the current year
+        this_year = now_thai().year
+        periods.update(range(this_year * 100 + 1, this_year * 100 + 13))
+    return periods
+
+def stats_stamp(endpoint, versions):
+    """``(version, last modified)`` of a payload, from the StatsVersion rows of its stats_periods().
+
+    Versions only ever go up, so their sum changes whenever one of them does.
+    """
+    version = sum(v.version for v in versions)
+    if endpoint == 'dashboard-stats':
+        version = f'{now_thai():%Y%m%d}.{version}'  # the daily sum moves on at midnight
+    return version, max((v.updated_at for v in versions), default=None)
+
+def stats_version(endpoint, month, year):
+    versions = StatsVersion.query.filter(StatsVersion.period.in_(stats_periods(endpoint, month, year))).all()
+    return stats_stamp(endpoint, versions)
+
+def stats_etag(endpoint, kind, month, year, version):
+    return f'{endpoint}-{kind or "all"}-{year * 100 + month}-v{version}'
+
+def cached_stats(endpoint, kind, month, year, version):
+    """Return the payload for a month, recomputing it only if the month changed since it was cached.
+
+    ``version`` comes from stats_version(), read *before* calling so the cached
+    payload is never older than the version it is stored under.
+    """
+    key = (endpoint, kind, month, year)
+    cached = stats_cache.get(key)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    query, shape = STATS_COMPUTE[endpoint]
+    payload = shape(db.session.execute(query(kind, month, year)).all(), kind, month, year)
+    stats_cache.set(key, (version, payload))
+    return payload
+
+def parse_month_year(args):
+    """month/year query args (default: the current month); ValueError if they are not a real month."""
+    month = int(args.get('month') or datetime.utcnow().month)
+    year = int(args.get('year') or datetime.utcnow().year)
+    if not 1 <= month <= 12 or not 1 <= year <= 9999:
+        raise ValueError(f'bad month {year}-{month}')
+    return month, year
+
+def stats_request_args():
+    try:
+        return parse_month_year(request.args)
+    except ValueError:
+        abort(400)
+
+def stats_response(endpoint, kind, month, year):
+    """JSON response for cached stats, with an ETag/Last-Modified so browsers can revalidate with a 304."""
+    version, updated_at = stats_version(endpoint, month, year)
+    etag = stats_etag(endpoint, kind, month, year, version)
+    # weak comparison: Compression marks the ETag weak on compressed responses
+    if request.if_none_match.contains_weak(etag):
+        resp = Response(status=304)
+    else:
+        resp = jsonify(cached_stats(endpoint, kind, month, year, version))
+    resp.set_etag(etag)
+    if updated_at is not None:
+        resp.last_modified = TH_TZ.localize(updated_at)
+    resp.cache_control.private = True
+    resp.cache_control.no_cache = True
+    return resp
+
 @app.route('/monthly-stats')
 @login_required
 def monthly_stats():
-    month = int(request.args.get('month') or datetime.utcnow().month)
-    year = int(request.args.get('year') or datetime.utcnow().year)
-    stats = get_monthly_stats(month, year)
-    return jsonify(stats)
+    month, year = stats_request_args()
+    return stats_response('monthly-stats', None, month, year)
 
 @app.route('/chart-data')
 @login_required
 def chart_data():
     # returns pie chart data for selected month/year and kind (income/expense)
-    month = int(request.args.get('month') or datetime.utcnow().month)
-    year = int(request.args.get('year') or datetime.utcnow().year)
-    kind = request.args.get('kind') or 'expense'
-    is_income = True if kind == 'income' else False
-    # include entries from all users for chart
-    entries = Entry.query.filter_by(is_income=is_income).filter(db.extract('year', Entry.created_at) == year, db.extract('month', Entry.created_at) == month).all()
-    sums = {}
-    for e in entries:
-        key = e.category or e.custom_name or 'อื่นๆ'
-        sums[key] = sums.get(key, 0) + e.amount
-    labels = list(sums.keys())
-    values = [sums[k] for k in labels]
-    return jsonify({'labels': labels, 'values': values})
+    month, year = stats_request_args()
+    kind = 'income' if request.args.get('kind') == 'income' else 'expense'
+    return stats_response('chart-data', kind, month, year)
+
+@app.route('/api/dashboard-stats')
+@login_required
+def api_dashboard_stats():
+    # totals, the month's summary and both category breakdowns, so the page needs a single call
+    month, year = stats_request_args()
+    return stats_response('dashboard-stats', None, month, year)
+
+@app.route('/cache-stats')
+@login_required
+def cache_stats():
+    if not current_user.is_admin:
+        abort(403)
+    return jsonify({'stats': stats_cache.stats()})
+
+# Reports: pandas over the daily rollups (all users, like the chart). Dates are
+# inclusive YYYY-MM-DD, months inclusive YYYY-MM.
+REPORT_MAX_DAYS = 3 * 366
+REPORT_MAX_MONTHS = 10 * 12
+
+def report_frame(start, end, monthly=False):
+    """Rollups for days in [start, end), summed over users, as a DataFrame for reports.py.
+
+    For the month-grained reports (``monthly``, with month-aligned bounds) the
+    archived years in range are read from their frozen monthly summaries instead.
+    """
+    years = [y for y in archived_years() if start.year <= y and date(y, 1, 1) < end] if monthly else []
+    stmt = db.select(
+        DailyRollup.day, DailyRollup.is_income, DailyRollup.category_key,
+        db.func.sum(DailyRollup.total).label('total'), db.func.sum(DailyRollup.count).label('count'),
+    ).where(DailyRollup.day >= start, DailyRollup.day < end, *outside_years(DailyRollup.day, years)
+    ).group_by(DailyRollup.day, DailyRollup.is_income, DailyRollup.category_key)
+    summaries = db.select(
+        PeriodSummary.period.label('day'), PeriodSummary.is_income, PeriodSummary.category_key,
+        db.func.sum(PeriodSummary.total).label('total'), db.func.sum(PeriodSummary.count).label('count'),
+    ).where(PeriodSummary.grain == 'month', PeriodSummary.period >= start.year * 100 + start.month,
+            PeriodSummary.period < end.year * 100 + end.month,
+    ).group_by(PeriodSummary.period, PeriodSummary.is_income, PeriodSummary.category_key) if years else None
+    return reports.load_frame(db.session.connection(), stmt, monthly=summaries)
+
+def add_months(day, n):
+    months = day.year * 12 + day.month - 1 + n
+    return date(months // 12, months % 12 + 1, 1)
+
+def report_month_range(default_months):
+    """[first month, first month after the last) from ?start=YYYY-MM&end=YYYY-MM; 400 if invalid."""
+    try:
+        this_month = now_thai().date().replace(day=1)
+        end = add_months(datetime.strptime(request.args['end'], '%Y-%m').date() if request.args.get('end')
+                         else this_month, 1)
+        start = (datetime.strptime(request.args['start'], '%Y-%m').date() if request.args.get('start')
+                 else add_months(end, -default_months))
+    except ValueError:
+        abort(400)
+    if not start < end <= add_months(start, REPORT_MAX_MONTHS):
+        abort(400)
+    return start, end
+
+def report_int_arg(name, default, low, high):
+    try:
+        value = int(request.args.get(name) or default)
+    except ValueError:
+        abort(400)
+    if not low <= value <= high:
+        abort(400)
+    return value
+
+@app.route('/reports/daily')
+@login_required
+def report_daily():
+    # per-day income/expense/balance, zero-filled, with a rolling mean (?window= days)
+    try:
+        end = (date.fromisoformat(request.args['end']) if request.args.get('end') else now_thai().date()) + timedelta(days=1)
+        start = date.fromisoformat(request.args['start']) if request.args.get('start') else end - timedelta(days=30)
+    except ValueError:
+        abort(400)
+    if not start < end <= start + timedelta(days=REPORT_MAX_DAYS):
+        abort(400)
+    window = report_int_arg('window', 7, 1, 90)
+    frame = report_frame(start - timedelta(days=window - 1), end)
+    return jsonify(reports.daily_series(frame, start, end, window))
+
+@app.route('/reports/monthly')
+@login_required
+def report_monthly():
+    # per-month totals over the last 12 months by default, with a rolling mean (?window= months)
+    start, end = report_month_range(12)
+    window = report_int_arg('window', 3, 1, 24)
+    frame = report_frame(add_months(start, -(window - 1)), end, monthly=True)
+    return jsonify(reports.monthly_series(frame, start, end, window))
+
+@app.route('/reports/yoy')
+@login_required
+def report_yoy():
+    # each month of ?year= against the same month a year earlier
+    year = report_int_arg('year', now_thai().year, 2, 9998)
+    frame = report_frame(date(year - 1, 1, 1), date(year + 1, 1, 1), monthly=True)
+    return jsonify(reports.year_over_year(frame, year))
+
+@app.route('/reports/categories')
+@login_required
+def report_categories():
+    # monthly totals per category of ?kind= with share and trend, top ?top= categories
+    kind = 'income' if request.args.get('kind') == 'income' else 'expense'
+    start, end = report_month_range(12)
+    top = report_int_arg('top', 8, 1, 50)
+    return jsonify(reports.category_trends(report_frame(start, end, monthly=True), start, end, kind, top))
 
 if __name__ == '__main__':
+    import migrations
+    with app.app_context():
+        migrations.upgrade()
     app.run(debug=True)
@@ -0,0 +1,177 @@
+"""Optional async serving mode: the read-only JSON endpoints on an async driver.
+
+    pip install -r requirements-async.txt
+    uvicorn asgi:app --workers 4
+
+/ping, /monthly-stats, /chart-data and /api/dashboard-stats are served here by
+async views that run the same statements as app.py (STATS_COMPUTE, the
+Entry/User/DailyRollup/StatsVersion models) on an
+aiosqlite or asyncpg engine, so a slow aggregation only parks a coroutine
+instead of a whole worker. Every other route falls through to the Flask app,
+run in a thread pool, so the HTML pages, forms, jobs and /metrics work as
+under gunicorn.
+
+Authentication reads Flask's signed session cookie with Flask's own session
+interface and looks the user up through the shared user_cache and its
+UserVersion check, so logging in through the Flask routes works for both. The stats cache and the StatsVersion
+invalidation are shared as well.
+"""
+import contextlib
+import functools
+from datetime import timezone
+from email.utils import format_datetime
+from urllib.parse import quote
+
+from a2wsgi import WSGIMiddleware
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, PlainTextResponse, RedirectResponse, Response
+from starlette.routing import Mount, Route
+
+from app import (app as flask_app, db, User, UserVersion, StatsVersion, TH_TZ, STATS_COMPUTE,
+                 parse_month_year, sqlite_pragmas, stats_cache, stats_etag, stats_periods, stats_stamp,
+                 user_cache, user_version_seen)
+
+ASYNC_DRIVERS = {'sqlite': 'sqlite+aiosqlite', 'postgresql': 'postgresql+asyncpg'}
+
+
+def async_database_url(url):
+    url = make_url(url)
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise RuntimeError(f'no async driver configured for {backend}')
+    return url.set(drivername=ASYNC_DRIVERS[backend])
+
+
+engine = create_async_engine(async_database_url(flask_app.config['SQLALCHEMY_DATABASE_URI']),
+                             **flask_app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {}))
+if 'SQLITE_PRAGMAS' in flask_app.config:
+    db.event.listen(engine.sync_engine, 'connect', sqlite_pragmas)
+Session = async_sessionmaker(engine, expire_on_commit=False)
+
+
+async def load_user(session, user_id):
+    """User column values for ``user_id``, via the same cache and UserVersion check as app.load_user."""
+    version = user_version_seen.get()
+    if version is None:
+        version = await session.scalar(db.select(UserVersion.version).where(UserVersion.id == 1)) or 0
+        user_version_seen.set(version)
+    cached = user_cache.get(user_id)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    row = (await session.execute(db.select(User.__table__).where(User.id == user_id))).mappings().first()
+    if row is None:
+        return None
+    values = dict(row)
+    user_cache.set(user_id, (version, values))
+    return values
+
+
+def login_required(view):
+    """Async counterpart of flask_login.login_required, reading Flask's session cookie."""
+    @functools.wraps(view)
+    async def wrapper(request):
+        # SecureCookieSessionInterface only needs request.cookies, which Starlette has too
+        session_data = flask_app.session_interface.open_session(flask_app, request)
+        user_id = session_data.get('_user_id') if session_data is not None else None
+        async with Session() as session:
+            user = await load_user(session, int(user_id)) if user_id else None
+            if user is None:
+                return RedirectResponse(f'/login?next={quote(request.url.path)}', status_code=302)
+            request.state.user = user
+            request.state.session = session
+            return await view(request)
+    return wrapper
+
+
+def month_year_or_400(request):
+    try:
+        return parse_month_year(request.query_params)
+    except ValueError:
+        return None
+
+
+def if_none_match(request, etag):
+    header = request.headers.get('if-none-match', '')
+    tags = {t.strip().removeprefix('W/').strip('"') for t in header.split(',')}
+    return etag in tags or '*' in tags
+
+
+async def stats_response(request, endpoint, kind, month, year):
+    """Async stats_response(): same ETag, cache entries and headers as the Flask view."""
+    session = request.state.session
+    versions = (await session.execute(db.select(StatsVersion).where(
+        StatsVersion.period.in_(stats_periods(endpoint, month, year))))).scalars().all()
+    version, updated_at = stats_stamp(endpoint, versions)
+    etag = stats_etag(endpoint, kind, month, year, version)
+    if if_none_match(request, etag):
+        resp = Response(status_code=304)
+    else:
+        key = (endpoint, kind, month, year)
+        cached = stats_cache.get(key)
+        if cached is not None and cached[0] == version:
+            payload = cached[1]
+        else:
+            query, shape = STATS_COMPUTE[endpoint]
+            payload = shape((await session.execute(query(kind, month, year))).all(), kind, month, year)
+            stats_cache.set(key, (version, payload))
+        resp = JSONResponse(payload)
+    resp.headers['ETag'] = f'"{etag}"'
+    if updated_at is not None:
+        resp.headers['Last-Modified'] = format_datetime(
+            TH_TZ.localize(updated_at).astimezone(timezone.utc), usegmt=True)
+    resp.headers['Cache-Control'] = 'private, no-cache'
+    return resp
+
+
+async def ping(request):
+    return PlainTextResponse('ok')
+
+
+@login_required
+async def monthly_stats(request):
+    period = month_year_or_400(request)
+    if period is None:
+        return PlainTextResponse('bad month', status_code=400)
+    return await stats_response(request, 'monthly-stats', None, *period)
+
+
+@login_required
+async def chart_data(request):
+    period = month_year_or_400(request)
+    if period is None:
+        return PlainTextResponse('bad month', status_code=400)
+    kind = 'income' if request.query_params.get('kind') == 'income' else 'expense'
+    return await stats_response(request, 'chart-data', kind, *period)
+
+
+@login_required
+async def api_dashboard_stats(request):
+    period = month_year_or_400(request)
+    if period is None:
+        return PlainTextResponse('bad month', status_code=400)
+    return await stats_response(request, 'dashboard-stats', None, *period)
+
+
+@contextlib.asynccontextmanager
+async def lifespan(starlette_app):
+    # the schema is migrated at deploy time (flask --app app db-upgrade); this only
+    # migrates a SQLite file in place or refuses to start on a stale server database
+    import migrations
+    with flask_app.app_context():
+        migrations.ensure_schema()
+    yield
+    await engine.dispose()
+
+
+app = Starlette(
+    routes=[
+        Route('/ping', ping),
+        Route('/monthly-stats', monthly_stats),
+        Route('/chart-data', chart_data),
+        Route('/api/dashboard-stats', api_dashboard_stats),
+        Mount('/', app=WSGIMiddleware(flask_app)),
+    ],
+    lifespan=lifespan,
+)
@@ -0,0 +1,213 @@
+"""Fingerprinted static URLs, pre-compressed static files and gzip/brotli responses.
+
+    StaticAssets(app)     # url_for('static', filename='main.js') -> /static/main.1f3c9a0b7d2e.js
+    Compression(app)      # gzip/brotli for HTML, JSON and CSV responses
+    python assets.py      # write static/*.br and *.gz next to the sources (at build time)
+
+Fingerprinting puts a hash of the file's content into the URL that
+url_for('static') builds. Requests for that name are served with a one-year
+immutable Cache-Control, so a browser only fetches an asset again once it has
+changed. Plain names, and names with an outdated hash (a page cached from the
+previous deploy), are still served with the usual revalidation.
+
+When the client accepts it and ``python assets.py`` has left a .br or .gz copy
+that is at least as new as the source, that copy is sent with Content-Encoding
+set instead of compressing the file on every request.
+
+Dynamic HTML, JSON and CSV responses of at least COMPRESS_MIN_SIZE bytes are
+compressed with brotli when the brotli package is installed and the client
+accepts it, and with gzip otherwise. Streamed responses (CSV exports and job
+downloads) are compressed chunk by chunk, so they stay streamed.
+"""
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+import sys
+import threading
+import zlib
+
+from flask import request, send_file, abort
+from werkzeug.utils import safe_join
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+COMPRESSIBLE_TYPES = {'text/html', 'application/json', 'text/csv'}
+# static files worth pre-compressing; images and fonts are compressed already
+STATIC_SUFFIXES = ('.js', '.css', '.svg', '.json', '.txt', '.html')
+FINGERPRINT = re.compile(r'^(?P<stem>.+)\.(?P<digest>[0-9a-f]{12})(?P<ext>\.[^./]+)$')
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+
+def accepted_encoding(available):
+    """'br' or 'gzip' (in that order of preference) if the request accepts it and it is in ``available``."""
+    accept = request.accept_encodings
+    for encoding in ('br', 'gzip'):
+        if encoding in available and accept[encoding] > 0:
+            return encoding
+    return None
+
+
+class StaticAssets:
+
+    def __init__(self, app=None):
+        self._lock = threading.Lock()
+        self._digests = {}  # filename -> (mtime_ns, size, digest)
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.folder = app.static_folder
+        app.url_defaults(self._fingerprint_url)
+        app.view_functions['static'] = self.static_view
+
+    def digest(self, filename):
+        """Short content hash of a static file, or None if there is no such file."""
+        path = safe_join(self.folder, filename)
+        try:
+            st = os.stat(path) if path else None
+        except OSError:
+            st = None
+        if st is None:
+            return None
+        cached = self._digests.get(filename)
+        if cached and cached[:2] == (st.st_mtime_ns, st.st_size):
+            return cached[2]
+        with open(path, 'rb') as f:
+            digest = hashlib.sha256(f.read()).hexdigest()[:12]
+        with self._lock:
+            self._digests[filename] = (st.st_mtime_ns, st.st_size, digest)
+        return digest
+
+    def _fingerprint_url(self, endpoint, values):
+        if endpoint == 'static' and 'filename' in values:
+            digest = self.digest(values['filename'])
+            if digest:
+                stem, ext = os.path.splitext(values['filename'])
+                values['filename'] = f'{stem}.{digest}{ext}'
+
+    def static_view(self, filename):
+        immutable = False
+        match = FINGERPRINT.match(filename)
+        if match:
+            source = match['stem'] + match['ext']
+            digest = self.digest(source)
+            if digest is not None:
+                immutable = digest == match['digest']
+                filename = source
+        path = safe_join(self.folder, filename)
+        if path is None or not os.path.isfile(path):
+            abort(404)
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        encoding = None
+        if filename.endswith(STATIC_SUFFIXES):
+            mtime = os.stat(path).st_mtime_ns
+            fresh = {enc for enc, ext in (('br', '.br'), ('gzip', '.gz'))
+                     if os.path.isfile(path + ext) and os.stat(path + ext).st_mtime_ns >= mtime}
+            encoding = accepted_encoding(fresh)
+        if encoding:
+            response = send_file(path + ('.br' if encoding == 'br' else '.gz'), mimetype=mimetype, conditional=True)
+            response.headers['Content-Encoding'] = encoding
+        else:
+            response = send_file(path, mimetype=mimetype, conditional=True)
+        if filename.endswith(STATIC_SUFFIXES):
+            response.vary.add('Accept-Encoding')
+        if immutable:
+            response.headers['Cache-Control'] = IMMUTABLE
+        return response
+
+
+def compressor(encoding, gzip_level, brotli_quality):
+    """(compress, finish) functions of a streaming compressor for ``encoding``."""
+    if encoding == 'br':
+        c = brotli.Compressor(quality=brotli_quality)
+        return c.process, c.finish
+    c = zlib.compressobj(gzip_level, zlib.DEFLATED, 31)  # wbits 31 = gzip container
+    return c.compress, c.flush
+
+
+class Compression:
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('COMPRESS_MIN_SIZE', int(os.environ.get('COMPRESS_MIN_SIZE', 1024)))  # bytes
+        app.config.setdefault('COMPRESS_GZIP_LEVEL', int(os.environ.get('COMPRESS_GZIP_LEVEL', 6)))
+        # brotli 4-5 compresses about as fast as gzip 6 and smaller; 11 is for the build step only
+        app.config.setdefault('COMPRESS_BROTLI_QUALITY', int(os.environ.get('COMPRESS_BROTLI_QUALITY', 5)))
+        self.min_size = app.config['COMPRESS_MIN_SIZE']
+        self.gzip_level = app.config['COMPRESS_GZIP_LEVEL']
+        self.brotli_quality = app.config['COMPRESS_BROTLI_QUALITY']
+        self.available = {'br', 'gzip'} if brotli is not None else {'gzip'}
+        app.after_request(self._after_request)
+
+    def _after_request(self, response):
+        if (response.status_code != 200 or request.method == 'HEAD'
+                or response.mimetype not in COMPRESSIBLE_TYPES or 'Content-Encoding' in response.headers):
+            return response
+        response.vary.add('Accept-Encoding')
+        streamed = response.is_streamed or response.direct_passthrough
+        size = response.content_length if streamed else len(response.get_data())
+        if size is not None and size < self.min_size:
+            return response
+        encoding = accepted_encoding(self.available)
+        if encoding is None:
+            return response
+        compress, finish = compressor(encoding, self.gzip_level, self.brotli_quality)
+        if streamed:
+            response.response = self._stream(response.iter_encoded(), response.response, compress, finish)
+            response.direct_passthrough = False
+            response.headers.pop('Content-Length', None)
+        else:
+            response.set_data(compress(response.get_data()) + finish())
+        response.headers['Content-Encoding'] = encoding
+        # the compressed body is a different representation of the same content
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
+
+    @staticmethod
+    def _stream(chunks, source, compress, finish):
+        try:
+            for chunk in chunks:
+                out = compress(chunk)
+                if out:
+                    yield out
+            yield finish()
+        finally:
+            if hasattr(source, 'close'):
+                source.close()
+
+
+def precompress(folder, min_size=1024):
+    """Write .br (when brotli is installed) and .gz copies of the compressible files in ``folder``."""
+    written = []
+    for root, _, files in os.walk(folder):
+        for name in files:
+            path = os.path.join(root, name)
+            if not name.endswith(STATIC_SUFFIXES) or os.path.getsize(path) < min_size:
+                continue
+            with open(path, 'rb') as f:
+                data = f.read()
+            variants = {'.gz': gzip.compress(data, 9, mtime=0)}
+            if brotli is not None:
+                variants['.br'] = brotli.compress(data, quality=11)
+            for ext, body in variants.items():
+                if len(body) < len(data):
+                    with open(path + ext, 'wb') as f:
+                        f.write(body)
+                    written.append((path + ext, len(data), len(body)))
+    return written
+
+
+if __name__ == '__main__':
+    static = sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+    for path, before, after in precompress(static, int(os.environ.get('COMPRESS_MIN_SIZE', 1024))):
+        print(f'{path}: {before} -> {after} bytes')
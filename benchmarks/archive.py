@@ -0,0 +1,79 @@
+"""Current-period routes before and after archiving the closed years.
+
+    python -m benchmarks.archive --entries 200000 --years 4
+
+Seeds ``--years`` years of entries and times a set of routes in process. Then
+it archives every closed year (archive_year) and times the same routes again,
+plus the archive-inclusive variants of search and export (?archived=1). Times
+are per-request medians in ms.
+"""
+import argparse
+import statistics
+import time
+
+from benchmarks.common import load_app, seed_entries
+
+ROUTES = [
+    ('dashboard', '/dashboard'),
+    ('search', '/dashboard?q=ค่าน้ำดื่ม'),
+    ('search_short', '/dashboard?q=ค่'),
+    ('export_this_year', '/export-csv-debug?start={year}-01-01'),
+    ('reports_yoy', '/reports/yoy'),
+    ('reports_monthly', '/reports/monthly'),
+    ('admin', '/admin'),
+]
+ARCHIVED_ROUTES = [
+    ('search_archived', '/dashboard?q=ค่าน้ำดื่ม&archived=1'),
+    ('export_all_archived', '/export-csv-debug?archived=1'),
+]
+
+
+def timed(client, url, n):
+    samples = []
+    for _ in range(n):
+        t0 = time.perf_counter()
+        resp = client.get(url)
+        resp.get_data()  # exports stream, so read the whole body
+        resp.close()
+        samples.append((time.perf_counter() - t0) * 1000)
+        assert resp.status_code == 200, (url, resp.status_code)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--entries', type=int, default=200_000)
+    parser.add_argument('--years', type=int, default=4)
+    parser.add_argument('--requests', type=int, default=10)
+    args = parser.parse_args()
+
+    m = load_app()
+    seed_entries(m, args.entries, days=args.years * 365)
+    client = m.app.test_client()
+    client.post('/login', data={'username': 'admin', 'password': 'admin'})
+    year = m.now_thai().year
+    routes = [(name, url.format(year=year)) for name, url in ROUTES]
+    before = {name: timed(client, url, args.requests) for name, url in routes}
+
+    with m.app.app_context():
+        closed = [y for (y,) in m.db.session.query(m.Entry.local_year).distinct() if y < year]
+        t0 = time.perf_counter()
+        moved = sum(m.archive_year(y) for y in sorted(closed))
+        print(f'archived {moved} entries of {sorted(closed)} in {time.perf_counter() - t0:.1f}s, '
+              f'{m.Entry.query.count()} left in entry')
+        # reclaim the pages the moved rows left in `entry` and refresh the planner statistics
+        if m.db.engine.dialect.name == 'sqlite':
+            with m.db.engine.connect() as conn:
+                conn.exec_driver_sql('VACUUM')
+                conn.exec_driver_sql('ANALYZE')
+    after = {name: timed(client, url, args.requests) for name, url in routes}
+
+    print(f"{'route':<22} {'before ms':>10} {'after ms':>10}")
+    for name, _ in routes:
+        print(f'{name:<22} {before[name]:>10.1f} {after[name]:>10.1f}')
+    for name, url in ARCHIVED_ROUTES:
+        print(f"{name:<22} {'':>10} {timed(client, url, args.requests):>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
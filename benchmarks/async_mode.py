@@ -0,0 +1,93 @@
+"""Sync (gunicorn) vs. async (uvicorn asgi:app) serving of the JSON endpoints at high concurrency.
+
+    python -m benchmarks.async_mode --entries 100000 --workers 2 --concurrency 64 --requests 2000
+
+Seeds a ledger, then serves it once with ``gunicorn app:app`` (sync workers)
+and once with ``uvicorn asgi:app``, both with ``--workers`` processes, and
+fires ``--requests`` requests per endpoint from ``--concurrency`` client
+threads. Needs requirements-async.txt.
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.common import load_app, seed_entries
+from benchmarks.harness import HttpDriver, free_port, start_gunicorn, summarize_samples
+
+ENDPOINTS = ['/ping', '/monthly-stats', '/chart-data?kind=income', '/api/dashboard-stats']
+
+
+def start_uvicorn(db_path, workers, jobs_dir):
+    port = free_port()
+    env = dict(os.environ, DATABASE_URL=f'sqlite:///{db_path}', JOBS_DIR=jobs_dir)
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    proc = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'asgi:app', '--workers', str(workers),
+         '--port', str(port), '--log-level', 'warning', '--no-access-log'],
+        cwd=root, env=env)
+    base_url = f'http://127.0.0.1:{port}'
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(base_url + '/ping', timeout=1).read()
+            return proc, base_url
+        except OSError:
+            if proc.poll() is not None:
+                break
+            time.sleep(0.2)
+    proc.kill()
+    raise SystemExit('uvicorn did not come up')
+
+
+def drive(base_url, path, n, concurrency):
+    driver = HttpDriver(base_url)
+    driver.request('POST', '/login', data={'username': 'admin', 'password': 'admin'})
+
+    def one(_):
+        t0 = time.perf_counter()
+        status, _ = driver.request('GET', path)
+        return (time.perf_counter() - t0) * 1000, status >= 400
+
+    one(0)
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        results = list(pool.map(one, range(n)))
+    return summarize_samples([r[0] for r in results], sum(r[1] for r in results), time.perf_counter() - t0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--entries', type=int, default=100_000)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--requests', type=int, default=2000)
+    args = parser.parse_args()
+
+    m = load_app()
+    seed_entries(m, args.entries)
+    db_path = m.app.config['SQLALCHEMY_DATABASE_URI'].replace('sqlite:///', '', 1)
+
+    servers = {
+        'sync': lambda: start_gunicorn(db_path, args.workers, 1, tempfile.mkdtemp(prefix='bench-jobs-')),
+        'async': lambda: start_uvicorn(db_path, args.workers, tempfile.mkdtemp(prefix='bench-jobs-')),
+    }
+    print(f"{'mode':<6} {'endpoint':<24} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    for mode, start in servers.items():
+        proc, base_url = start()
+        try:
+            for path in ENDPOINTS:
+                r = drive(base_url, path, args.requests, args.concurrency)
+                print(f"{mode:<6} {path:<24} {r['throughput_rps']:>8.1f} {r['p50_ms']:>8.1f} {r['p95_ms']:>8.1f} "
+                      f"{r['p99_ms']:>8.1f} {r['errors']:>7}")
+        finally:
+            proc.terminate()
+            proc.wait(10)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""Shared helpers for the benchmark scripts.
+
+Each benchmark points the app at a throwaway SQLite file *before* importing it,
+then fills the ledger with synthetic entries.
+"""
+import os
+import random
+import tempfile
+import time
+from datetime import timedelta
+
+
+def load_app(db_path=None):
+    """Import app.py bound to a fresh database and return the module."""
+    if db_path is None:
+        fd, db_path = tempfile.mkstemp(suffix='.db', prefix='bench-')
+        os.close(fd)
+        os.remove(db_path)
+    os.environ['DATABASE_URL'] = f'sqlite:///{db_path}'
+    import app as app_module
+    import migrations
+    with app_module.app.app_context():
+        migrations.upgrade()
+    return app_module
+
+
+# names used for entries without a lookup category, as typed into the form's custom field
+CUSTOM_NAMES = {
+    True: ['ขายกาแฟ', 'สแกนเอกสาร', 'เข้าเล่มรายงาน', 'ค่าส่งแฟกซ์', 'รับทำป้ายชื่อ'],
+    False: ['ค่าซ่อมเครื่องถ่ายเอกสาร', 'ค่าอินเทอร์เน็ต', 'ค่าน้ำดื่ม', 'ค่าขนส่ง', 'ค่าเช่าที่'],
+}
+NOTES = ['ลูกค้าประจำ', 'จ่ายเงินสด', 'โอนผ่านธนาคาร', 'รอใบเสร็จ', 'งานด่วน']
+
+
+def seed_entries(app_module, n, users=5, days=730, chunk=50_000, seed=1, custom_ratio=0.1, notes_ratio=0.2):
+    """Bulk insert ``n`` entries spread over the last ``days`` days.
+
+    Income rows take an INCOME_LOOKUP category and expense rows an EXPENSE_LOOKUP
+    one, except ``custom_ratio`` of them, which carry a custom name instead.
+    Users ``bench<i>`` are created until there are ``users`` in total. The same
+    ``seed`` always produces the same ledger (relative to today).
+    """
+    rnd = random.Random(seed)
+    db, Entry, User = app_module.db, app_module.Entry, app_module.User
+    now = app_module.now_thai().replace(tzinfo=None)
+    categories = {True: app_module.INCOME_LOOKUP, False: app_module.EXPENSE_LOOKUP}
+    with app_module.app.app_context():
+        user_ids = [u.id for u in User.query.all()]
+        for i in range(len(user_ids), users):
+            u = User(username=f'bench{i}')
+            u.set_password('bench')
+            db.session.add(u)
+            db.session.flush()
+            user_ids.append(u.id)
+        db.session.commit()
+        done = 0
+        while done < n:
+            rows = []
+            # ascending within a chunk, like a real ledger, which also keeps index inserts local
+            offsets = sorted((rnd.randrange(days * 86400) for _ in range(min(chunk, n - done))), reverse=True)
+            for offset in offsets:
+                created_at = now - timedelta(seconds=offset)
+                is_income = rnd.random() < 0.6
+                custom = rnd.random() < custom_ratio
+                rows.append({
+                    'user_id': rnd.choice(user_ids),
+                    'is_income': is_income,
+                    'category': None if custom else rnd.choice(categories[is_income]),
+                    'custom_name': rnd.choice(CUSTOM_NAMES[is_income]) if custom else None,
+                    'amount': round(rnd.uniform(5, 500), 2),
+                    'notes': rnd.choice(NOTES) if rnd.random() < notes_ratio else None,
+                    **Entry.created_at_columns(created_at),
+                })
+            db.session.execute(Entry.__table__.insert(), rows)
+            db.session.commit()
+            done += len(rows)
+        # the rows went in behind the app's back, so derive the rollups from them
+        app_module.rebuild_rollups()
+
+
+def login(client, username='admin', password='admin'):
+    client.post('/login', data={'username': username, 'password': password})
+    return client
+
+
+def wait_for_job(client, job_id, poll=0.05):
+    """Poll /jobs/<id> until the background job finishes and return its final state."""
+    while True:
+        job = client.get(f'/jobs/{job_id}').json
+        if job['status'] in ('done', 'failed'):
+            return job
+        time.sleep(poll)
+
+
+def timed(fn, repeat=5):
+    """Run ``fn`` ``repeat`` times and return the median wall time in ms."""
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    samples.sort()
+    return samples[len(samples) // 2]
@@ -0,0 +1,112 @@
+"""Concurrent writes on SQLite under gunicorn: SQLite's defaults vs. the app's pragmas.
+
+    python -m benchmarks.concurrent_writes --entries 100000 --workers 4 --writers 8 --readers 2 --seconds 20
+
+Seeds one ledger, then for each mode starts gunicorn on a fresh copy of it and
+for ``--seconds`` runs ``--writers`` threads posting /add-entry while
+``--readers`` threads stream /export-csv-debug (full-ledger reads). Reports
+committed writes/s, write latency percentiles, failed writes (5xx, i.e.
+"database is locked") and completed exports.
+
+``default`` is SQLite's own behaviour (rollback journal, synchronous=FULL, no
+mmap, 2 MB cache, pysqlite's 5 s busy timeout); ``tuned`` is what app.py sets
+up by default.
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from benchmarks.common import load_app, seed_entries
+from benchmarks.harness import HttpDriver, start_gunicorn, summarize_samples
+
+MODES = {
+    'default': {'SQLITE_JOURNAL_MODE': 'DELETE', 'SQLITE_SYNCHRONOUS': 'FULL', 'SQLITE_BUSY_TIMEOUT': '5000',
+                'SQLITE_MMAP_SIZE': '0', 'SQLITE_CACHE_SIZE': '-2000'},
+    'tuned': {},
+}
+
+
+def run_mode(db_path, env, args):
+    proc, base_url = start_gunicorn(db_path, args.workers, args.threads, tempfile.mkdtemp(prefix='bench-jobs-'), env)
+    stop = threading.Event()
+    lock = threading.Lock()
+    samples, failures, exports = [], [0], [0]
+    form = {'kind': 'expense', 'category': 'ค่ากระดาษ', 'amount': '120', 'notes': 'bench'}
+
+    def session():
+        driver = HttpDriver(base_url)
+        driver.request('POST', '/login', data={'username': 'admin', 'password': 'admin'})
+        return driver
+
+    def writer():
+        driver = session()
+        while not stop.is_set():
+            t0 = time.perf_counter()
+            status, _ = driver.request('POST', '/add-entry', data=form)
+            elapsed = (time.perf_counter() - t0) * 1000
+            with lock:
+                if status >= 500:
+                    failures[0] += 1
+                else:
+                    samples.append(elapsed)
+
+    def reader():
+        driver = session()
+        while not stop.is_set():
+            status, _ = driver.request('GET', '/export-csv-debug')
+            with lock:
+                exports[0] += status == 200
+
+    threads = [threading.Thread(target=writer) for _ in range(args.writers)]
+    threads += [threading.Thread(target=reader) for _ in range(args.readers)]
+    try:
+        t0 = time.perf_counter()
+        for t in threads:
+            t.start()
+        time.sleep(args.seconds)
+        stop.set()
+        for t in threads:
+            t.join()
+        wall = time.perf_counter() - t0
+    finally:
+        proc.terminate()
+        proc.wait(10)
+    result = summarize_samples(samples, failures[0], wall) if samples else {'n': 0, 'errors': failures[0]}
+    result['exports'] = exports[0]
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--entries', type=int, default=100_000)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--threads', type=int, default=1, help='threads per gunicorn worker')
+    parser.add_argument('--writers', type=int, default=8)
+    parser.add_argument('--readers', type=int, default=2)
+    parser.add_argument('--seconds', type=float, default=20)
+    parser.add_argument('--modes', nargs='+', choices=sorted(MODES), default=['default', 'tuned'])
+    args = parser.parse_args()
+
+    m = load_app()
+    seed_entries(m, args.entries)
+    with m.app.app_context():
+        m.db.engine.dispose()  # checkpoints the WAL into the main file before copying it
+    seeded = m.app.config['SQLALCHEMY_DATABASE_URI'].replace('sqlite:///', '', 1)
+
+    print(f"{'mode':<8} {'writes/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'failed':>7} {'exports':>8}")
+    for mode in args.modes:
+        db_path = os.path.join(tempfile.mkdtemp(prefix='bench-'), 'ledger.db')
+        shutil.copy(seeded, db_path)
+        r = run_mode(db_path, MODES[mode], args)
+        if r['n']:
+            print(f"{mode:<8} {r['throughput_rps']:>9.1f} {r['p50_ms']:>8.1f} {r['p95_ms']:>8.1f} {r['p99_ms']:>8.1f} "
+                  f"{r['errors']:>7} {r['exports']:>8}")
+        else:
+            print(f"{mode:<8} {'-':>9} {'-':>8} {'-':>8} {'-':>8} {r['errors']:>7} {r['exports']:>8}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+"""CSV import throughput.
+
+    python -m benchmarks.csv_import --sizes 10000 100000 1000000
+
+Writes a synthetic export-format CSV of each size, uploads it through
+``POST /import-csv`` and reports rows/sec until the import job finishes.
+"""
+import argparse
+import csv
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from benchmarks.common import load_app, login, wait_for_job
+
+
+def write_csv(path, n, categories, seed=1):
+    rnd = random.Random(seed)
+    start = datetime(2023, 1, 1)
+    with open(path, 'w', encoding='utf-8-sig', newline='') as fh:
+        cw = csv.writer(fh)
+        cw.writerow(['id', 'is_income', 'category', 'custom_name', 'amount', 'notes', 'created_at'])
+        for i in range(n):
+            created = start + timedelta(seconds=rnd.randrange(3 * 365 * 86400))
+            cw.writerow([i, rnd.random() < 0.6, rnd.choice(categories), '', round(rnd.uniform(5, 500), 2),
+                         '', created.isoformat()])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    args = parser.parse_args()
+
+    m = load_app()
+    client = login(m.app.test_client())
+    categories = m.INCOME_LOOKUP + m.EXPENSE_LOOKUP
+    print(f"{'rows':>10} {'seconds':>9} {'rows/sec':>10}")
+    for size in args.sizes:
+        fd, path = tempfile.mkstemp(suffix='.csv')
+        os.close(fd)
+        try:
+            write_csv(path, size, categories, seed=size)
+            with open(path, 'rb') as fh:
+                t0 = time.perf_counter()
+                r = client.post('/import-csv?format=json', data={'file': (fh, 'bench.csv')},
+                                content_type='multipart/form-data')
+                job = wait_for_job(client, r.json['id'])
+                elapsed = time.perf_counter() - t0
+            assert job['status'] == 'done' and job['result']['accepted'] == size, job
+            print(f'{size:>10} {elapsed:>9.2f} {size / elapsed:>10.0f}')
+        finally:
+            os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+"""Dashboard latency at increasing ledger sizes.
+
+    python -m benchmarks.dashboard --sizes 10000 100000 1000000
+
+Reports the median time of the dashboard's stats query on its own (the
+cache-miss path) and of a full ``GET /dashboard`` render. ``--legacy`` also times the old approach of loading
+every Entry and summing in Python, for comparison.
+"""
+import argparse
+
+from benchmarks.common import load_app, seed_entries, login, timed
+
+
+def legacy_summarize(app_module):
+    entries = app_module.Entry.query.all()
+    today = app_module.now_thai().date()
+    signed = [(e.created_at, e.amount if e.is_income else -e.amount) for e in entries]
+    daily = sum(v for d, v in signed if d.date() == today)
+    monthly = sum(v for d, v in signed if d.year == today.year and d.month == today.month)
+    yearly = sum(v for d, v in signed if d.year == today.year)
+    return {'daily': daily, 'monthly': monthly, 'yearly': yearly}
+
+
+def dashboard_stats(app_module):
+    today = app_module.now_thai()
+    rows = app_module.db.session.execute(app_module.dashboard_stats_query(today.month, today.year)).all()
+    return app_module.dashboard_stats_from_rows(today.month, today.year, rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--legacy', action='store_true')
+    args = parser.parse_args()
+
+    app_module = load_app()
+    client = login(app_module.app.test_client())
+    seeded = 0
+    print(f"{'entries':>10} {'stats ms':>14} {'dashboard ms':>14}" + (f" {'legacy ms':>12}" if args.legacy else ''))
+    for size in sorted(args.sizes):
+        seed_entries(app_module, size - seeded, seed=size)
+        seeded = size
+        with app_module.app.app_context():
+            stats = timed(lambda: dashboard_stats(app_module), args.repeat)
+            legacy = timed(lambda: legacy_summarize(app_module), args.repeat) if args.legacy else None
+        page = timed(lambda: client.get('/dashboard'), args.repeat)
+        line = f'{size:>10} {stats:>14.1f} {page:>14.1f}'
+        if legacy is not None:
+            line += f' {legacy:>12.1f}'
+        print(line)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,37 @@
+"""Seed a SQLite file with a synthetic ledger to benchmark against.
+
+    python -m benchmarks.generate bench.db --users 20 --entries 1000000 --years 3
+
+Creates the schema (admin/admin included), ``--users`` users in total and
+``--entries`` entries spread over the last ``--years`` years, then builds the
+rollups. Entries are appended, so running it again on the same file grows the
+ledger. The file can be reused by ``benchmarks.harness --database``.
+"""
+import argparse
+import os
+import time
+
+from benchmarks.common import load_app, seed_entries
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('database', help='SQLite file to create or extend')
+    parser.add_argument('--users', type=int, default=10)
+    parser.add_argument('--entries', type=int, default=100_000)
+    parser.add_argument('--years', type=int, default=3)
+    parser.add_argument('--custom-ratio', type=float, default=0.1, help='share of entries with a custom name')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    m = load_app(os.path.abspath(args.database))
+    seed_entries(m, args.entries, users=args.users, days=args.years * 365, seed=args.seed,
+                 custom_ratio=args.custom_ratio)
+    elapsed = time.perf_counter() - t0
+    print(f'{args.entries} entries for {args.users} users in {elapsed:.1f}s '
+          f'({args.entries / elapsed:,.0f} rows/s) -> {args.database}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,398 @@
+"""Latency / throughput / memory baseline for every route, with a compare mode.
+
+    python -m benchmarks.harness run --entries 100000 --out base.json
+    python -m benchmarks.harness run --database bench.db --gunicorn --workers 4 --concurrency 8 --out gu.json
+    python -m benchmarks.harness compare base.json new.json --threshold 0.10
+
+``run`` seeds a throwaway ledger (or reuses one made by ``benchmarks.generate``)
+and drives each scenario below either through the Flask test client in this
+process, or over HTTP against a local gunicorn started on the same database.
+Every scenario reports p50/p95/p99/mean latency in ms, errors and throughput;
+the run also records peak RSS (this process for the test client, the gunicorn
+master plus workers otherwise). Job scenarios (export, import) time the whole
+job, from the request until /jobs/<id> says it finished.
+
+``compare`` prints the relative change per scenario and exits 1 if p95
+latency, throughput or peak RSS regressed by more than ``--threshold``.
+Changes smaller than ``--noise-ms`` are ignored so fast routes do not flap.
+
+Destructive routes (delete, delete-all, admin user changes) are not driven.
+``add-entry`` and ``import-csv`` write, so the ledger grows a little during a
+run; they go last.
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import platform
+import random
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from http.cookiejar import CookieJar
+
+from benchmarks.common import load_app, seed_entries
+
+# (name, method, path, kind); {month}/{year} are filled in with the current period
+SCENARIOS = [
+    ('ping', 'GET', '/ping', 'request'),
+    ('login_page', 'GET', '/login', 'request'),
+    ('dashboard', 'GET', '/dashboard', 'request'),
+    ('dashboard_month', 'GET', '/dashboard?month={month}&year={year}', 'request'),
+    ('dashboard_search', 'GET', '/dashboard?q=%E0%B8%96%E0%B9%88%E0%B8%B2%E0%B8%A2', 'request'),  # ถ่าย
+    ('monthly_stats', 'GET', '/monthly-stats?month={month}&year={year}', 'request'),
+    ('chart_data_income', 'GET', '/chart-data?kind=income&month={month}&year={year}', 'request'),
+    ('chart_data_expense', 'GET', '/chart-data?kind=expense&month={month}&year={year}', 'request'),
+    ('dashboard_stats', 'GET', '/api/dashboard-stats?month={month}&year={year}', 'request'),
+    ('jobs', 'GET', '/jobs', 'request'),
+    ('admin', 'GET', '/admin', 'request'),
+    ('export_csv_debug', 'GET', '/export-csv-debug', 'heavy'),
+    ('export_csv', 'GET', '/export-csv?format=json', 'job'),
+    ('add_entry', 'POST', '/add-entry', 'write'),
+    ('import_csv', 'POST', '/import-csv?format=json', 'job'),
+]
+
+
+class ClientDriver:
+    """Requests through app.test_client(); always sequential."""
+
+    def __init__(self, app_module):
+        self.client = app_module.app.test_client()
+
+    def request(self, method, path, data=None, files=None):
+        if files:
+            data = dict(data or {}, **{k: (io.BytesIO(body), name) for k, (name, body) in files.items()})
+        resp = self.client.open(path, method=method, data=data)
+        return resp.status_code, resp.get_data()
+
+
+class NoRedirect(urllib.request.HTTPRedirectHandler):
+    # time the request itself, like the test client does, not the page it redirects to
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class HttpDriver:
+    """Requests over HTTP with a cookie session, safe to share between threads."""
+
+    def __init__(self, base_url):
+        self.base_url = base_url
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(CookieJar()), NoRedirect())
+
+    def request(self, method, path, data=None, files=None):
+        headers = {}
+        body = None
+        if files:
+            body, headers['Content-Type'] = multipart(data or {}, files)
+        elif data is not None:
+            body = urllib.parse.urlencode(data).encode()
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        req = urllib.request.Request(self.base_url + path, data=body, headers=headers, method=method)
+        try:
+            with self.opener.open(req, timeout=600) as resp:
+                return resp.status, resp.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.read()
+
+
+def multipart(fields, files):
+    boundary = uuid.uuid4().hex
+    out = io.BytesIO()
+    for k, v in fields.items():
+        out.write(f'--{boundary}\r\nContent-Disposition: form-data; name="{k}"\r\n\r\n{v}\r\n'.encode())
+    for k, (name, body) in files.items():
+        out.write(f'--{boundary}\r\nContent-Disposition: form-data; name="{k}"; filename="{name}"\r\n'
+                  f'Content-Type: text/csv\r\n\r\n'.encode())
+        out.write(body + b'\r\n')
+    out.write(f'--{boundary}--\r\n'.encode())
+    return out.getvalue(), f'multipart/form-data; boundary={boundary}'
+
+
+def import_payload(app_module, rows, seed=1):
+    """A small export-format CSV for the import scenario."""
+    rnd = random.Random(seed)
+    categories = {True: app_module.INCOME_LOOKUP, False: app_module.EXPENSE_LOOKUP}
+    now = datetime.now().replace(microsecond=0)
+    out = io.StringIO()
+    cw = csv.writer(out)
+    cw.writerow(['id', 'is_income', 'category', 'custom_name', 'amount', 'notes', 'created_at'])
+    for i in range(rows):
+        is_income = rnd.random() < 0.6
+        cw.writerow([i, is_income, rnd.choice(categories[is_income]), '', round(rnd.uniform(5, 500), 2),
+                     '', now.isoformat()])
+    return out.getvalue().encode('utf-8-sig')
+
+
+def run_job(driver, method, path, data=None, files=None, poll=0.05):
+    status, body = driver.request(method, path, data=data, files=files)
+    if status != 202:
+        return status
+    job_id = json.loads(body)['id']
+    while True:
+        status, body = driver.request('GET', f'/jobs/{job_id}')
+        job = json.loads(body)
+        if job['status'] in ('done', 'failed'):
+            return 200 if job['status'] == 'done' else 500
+        time.sleep(poll)
+
+
+def percentile(samples, p):
+    """Nearest-rank percentile of an already sorted list."""
+    k = max(0, min(len(samples) - 1, round(p / 100 * len(samples) + 0.5) - 1))
+    return samples[k]
+
+
+def summarize_samples(samples, errors, wall):
+    samples = sorted(samples)
+    return {
+        'n': len(samples),
+        'errors': errors,
+        'p50_ms': round(percentile(samples, 50), 3),
+        'p95_ms': round(percentile(samples, 95), 3),
+        'p99_ms': round(percentile(samples, 99), 3),
+        'mean_ms': round(sum(samples) / len(samples), 3),
+        'throughput_rps': round(len(samples) / wall, 2),
+    }
+
+
+def self_rss_mb():
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(rss / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def process_tree_hwm_mb(pid):
+    """Sum of VmHWM (peak RSS) over ``pid`` and its children; Linux only, else None."""
+    if not os.path.isdir('/proc'):
+        return None
+    pids = {pid}
+    for entry in os.listdir('/proc'):
+        if entry.isdigit():
+            try:
+                with open(f'/proc/{entry}/stat') as fh:
+                    if int(fh.read().rsplit(')', 1)[1].split()[1]) == pid:
+                        pids.add(int(entry))
+            except (OSError, IndexError, ValueError):
+                pass
+    total = 0
+    for p in pids:
+        try:
+            with open(f'/proc/{p}/status') as fh:
+                total += next(int(line.split()[1]) for line in fh if line.startswith('VmHWM:'))
+        except (OSError, StopIteration):
+            pass
+    return round(total / 1024, 1)
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_gunicorn(db_path, workers, threads, jobs_dir, env=None):
+    port = free_port()
+    env = dict(os.environ, DATABASE_URL=f'sqlite:///{db_path}', JOBS_DIR=jobs_dir, **(env or {}))
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    proc = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-w', str(workers), '--threads', str(threads),
+         '-b', f'127.0.0.1:{port}', '--log-level', 'warning', 'app:app'],
+        cwd=root, env=env)
+    base_url = f'http://127.0.0.1:{port}'
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(base_url + '/ping', timeout=1).read()
+            return proc, base_url
+        except OSError:
+            if proc.poll() is not None:
+                break
+            time.sleep(0.2)
+    proc.kill()
+    raise SystemExit('gunicorn did not come up')
+
+
+def run_scenario(driver, scenario, args, payload, concurrency):
+    name, method, path, kind = scenario
+    now = datetime.now()
+    path = path.format(month=now.month, year=now.year)
+    if kind == 'job':
+        files = {'file': ('bench.csv', payload)} if method == 'POST' else None
+        call = lambda: run_job(driver, method, path, files=files)  # noqa: E731
+        n, concurrency = args.job_requests, 1
+    elif kind == 'write':
+        form = {'kind': 'income', 'category': 'ถ่ายเอกสาร', 'amount': '20', 'notes': 'bench'}
+        call = lambda: driver.request(method, path, data=form)[0]  # noqa: E731
+        n = args.requests
+    else:
+        call = lambda: driver.request(method, path)[0]  # noqa: E731
+        n = args.job_requests if kind == 'heavy' else args.requests
+        for _ in range(args.warmup):
+            call()
+
+    def one(_):
+        t0 = time.perf_counter()
+        status = call()
+        return (time.perf_counter() - t0) * 1000, status >= 400
+
+    t0 = time.perf_counter()
+    if concurrency > 1:
+        with ThreadPoolExecutor(concurrency) as pool:
+            results = list(pool.map(one, range(n)))
+    else:
+        results = [one(i) for i in range(n)]
+    wall = time.perf_counter() - t0
+    return summarize_samples([r[0] for r in results], sum(r[1] for r in results), wall)
+
+
+def cmd_run(args):
+    db_path = os.path.abspath(args.database) if args.database else None
+    m = load_app(db_path)
+    if not args.database:
+        seed_entries(m, args.entries, users=args.users, days=args.years * 365, seed=args.seed)
+        db_path = m.app.config['SQLALCHEMY_DATABASE_URI'].replace('sqlite:///', '', 1)
+    with m.app.app_context():
+        entries = m.Entry.query.count()
+        users = m.User.query.count()
+    payload = import_payload(m, args.import_rows)
+    selected = [s for s in SCENARIOS if not args.only or s[0] in args.only]
+
+    proc = None
+    if args.gunicorn:
+        proc, base_url = start_gunicorn(db_path, args.workers, args.threads, tempfile.mkdtemp(prefix='bench-jobs-'))
+        driver = HttpDriver(base_url)
+        concurrency = args.concurrency
+    else:
+        driver = ClientDriver(m)
+        concurrency = 1
+    results = {}
+    try:
+        driver.request('POST', '/login', data={'username': 'admin', 'password': 'admin'})
+        for scenario in selected:
+            results[scenario[0]] = r = run_scenario(driver, scenario, args, payload, concurrency)
+            if not args.gunicorn:
+                r['rss_mb'] = self_rss_mb()
+            print(f"{scenario[0]:<20} n={r['n']:<5} p50={r['p50_ms']:>9.2f} p95={r['p95_ms']:>9.2f} "
+                  f"p99={r['p99_ms']:>9.2f} ms  {r['throughput_rps']:>8.1f} req/s"
+                  + (f"  errors={r['errors']}" if r['errors'] else ''), file=sys.stderr)
+        peak_rss = process_tree_hwm_mb(proc.pid) if proc else self_rss_mb()
+    finally:
+        if proc:
+            proc.terminate()
+            proc.wait(10)
+
+    report = {
+        'meta': {
+            'mode': 'gunicorn' if args.gunicorn else 'test_client',
+            'workers': args.workers if args.gunicorn else None,
+            'threads': args.threads if args.gunicorn else None,
+            'concurrency': concurrency,
+            'entries': entries,
+            'users': users,
+            'requests': args.requests,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'created': datetime.now().isoformat(timespec='seconds'),
+        },
+        'peak_rss_mb': peak_rss,
+        'scenarios': results,
+    }
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.out:
+        with open(args.out, 'w') as fh:
+            fh.write(text + '\n')
+    else:
+        print(text)
+
+
+def change(new, old):
+    return (new - old) / old if old else 0.0
+
+
+def cmd_compare(args):
+    with open(args.baseline) as fh:
+        base = json.load(fh)
+    with open(args.current) as fh:
+        cur = json.load(fh)
+    for key in ('mode', 'entries', 'concurrency'):
+        if base['meta'].get(key) != cur['meta'].get(key):
+            print(f"warning: {key} differs ({base['meta'].get(key)} vs {cur['meta'].get(key)})")
+
+    regressions = []
+    print(f"{'scenario':<20} {'p95 base':>10} {'p95 now':>10} {'change':>8} {'rps base':>10} {'rps now':>10} {'change':>8}")
+    for name, old in base['scenarios'].items():
+        new = cur['scenarios'].get(name)
+        if new is None:
+            print(f'{name:<20} missing from {args.current}')
+            continue
+        p95 = change(new['p95_ms'], old['p95_ms'])
+        rps = change(new['throughput_rps'], old['throughput_rps'])
+        flags = []
+        if p95 > args.threshold and new['p95_ms'] - old['p95_ms'] > args.noise_ms:
+            flags.append('p95')
+        if -rps > args.threshold and new['mean_ms'] - old['mean_ms'] > args.noise_ms:
+            flags.append('throughput')
+        if new['errors'] > old['errors']:
+            flags.append('errors')
+        regressions += [(name, f) for f in flags]
+        print(f"{name:<20} {old['p95_ms']:>10.2f} {new['p95_ms']:>10.2f} {p95:>+8.1%} "
+              f"{old['throughput_rps']:>10.1f} {new['throughput_rps']:>10.1f} {rps:>+8.1%}"
+              + ('  REGRESSION ' + ','.join(flags) if flags else ''))
+    if base.get('peak_rss_mb') and cur.get('peak_rss_mb'):
+        rss = change(cur['peak_rss_mb'], base['peak_rss_mb'])
+        flagged = rss > args.threshold
+        if flagged:
+            regressions.append(('peak_rss', 'rss'))
+        print(f"{'peak rss (MB)':<20} {base['peak_rss_mb']:>10.1f} {cur['peak_rss_mb']:>10.1f} {rss:>+8.1%}"
+              + ('  REGRESSION' if flagged else ''))
+    if regressions:
+        print(f'{len(regressions)} regression(s) above {args.threshold:.0%}')
+        sys.exit(1)
+    print('no regressions')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    run = sub.add_parser('run', help='measure every scenario and write a JSON baseline')
+    run.add_argument('--database', help='existing SQLite file (see benchmarks.generate); default: seed a new one')
+    run.add_argument('--entries', type=int, default=100_000)
+    run.add_argument('--users', type=int, default=10)
+    run.add_argument('--years', type=int, default=3)
+    run.add_argument('--seed', type=int, default=1)
+    run.add_argument('--requests', type=int, default=200, help='requests per scenario')
+    run.add_argument('--job-requests', type=int, default=3, help='runs of the export/import scenarios')
+    run.add_argument('--warmup', type=int, default=5)
+    run.add_argument('--import-rows', type=int, default=5000)
+    run.add_argument('--only', nargs='+', metavar='SCENARIO', help='run only these scenarios')
+    run.add_argument('--gunicorn', action='store_true', help='drive a local gunicorn over HTTP')
+    run.add_argument('--workers', type=int, default=2)
+    run.add_argument('--threads', type=int, default=4)
+    run.add_argument('--concurrency', type=int, default=4, help='client threads (gunicorn mode only)')
+    run.add_argument('--out', help='write the JSON report here instead of stdout')
+    run.set_defaults(func=cmd_run)
+
+    cmp = sub.add_parser('compare', help='compare two reports and flag regressions')
+    cmp.add_argument('baseline')
+    cmp.add_argument('current')
+    cmp.add_argument('--threshold', type=float, default=0.10, help='allowed relative slowdown (0.10 = 10%%)')
+    cmp.add_argument('--noise-ms', type=float, default=1.0, help='ignore absolute changes below this')
+    cmp.set_defaults(func=cmd_compare)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
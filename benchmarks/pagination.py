@@ -0,0 +1,48 @@
+"""Dashboard list latency on the first page versus a deep page.
+
+    python -m benchmarks.pagination --entries 100000 --page 5000
+
+Times ``GET /dashboard`` with no cursor and with a cursor pointing at the
+requested page, next to the old OFFSET/COUNT ``paginate()`` for the same pages.
+"""
+import argparse
+
+from benchmarks.common import load_app, seed_entries, login, timed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--entries', type=int, default=100_000)
+    parser.add_argument('--page', type=int, default=5000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    m = load_app()
+    seed_entries(m, args.entries)
+    client = login(m.app.test_client())
+    per_page = 10
+    with m.app.app_context():
+        # the row just before the requested page is what a "next" cursor would point at
+        anchor = m.Entry.query.order_by(m.Entry.created_at.desc(), m.Entry.id.desc()) \
+            .offset((args.page - 1) * per_page - 1).first()
+        cursor = m.encode_cursor('n', [anchor.created_at, anchor.id])
+
+        def offset_page(page):
+            return lambda: m.Entry.query.order_by(m.Entry.created_at.desc()).paginate(
+                page=page, per_page=per_page, error_out=False).items
+        offset_first = timed(offset_page(1), args.repeat)
+        offset_deep = timed(offset_page(args.page), args.repeat)
+        seek_first = timed(lambda: m.keyset_paginate(m.Entry.query, [m.Entry.created_at, m.Entry.id]), args.repeat)
+        seek_deep = timed(lambda: m.keyset_paginate(m.Entry.query, [m.Entry.created_at, m.Entry.id], cursor), args.repeat)
+
+    first = timed(lambda: client.get('/dashboard'), args.repeat)
+    deep = timed(lambda: client.get(f'/dashboard?cursor={cursor}'), args.repeat)
+    print(f'{args.entries} entries, page 1 vs page {args.page} (median ms)')
+    print(f"{'':>22} {'page 1':>8} {'deep':>8}")
+    print(f"{'offset paginate()':>22} {offset_first:>8.1f} {offset_deep:>8.1f}")
+    print(f"{'keyset_paginate()':>22} {seek_first:>8.1f} {seek_deep:>8.1f}")
+    print(f"{'GET /dashboard':>22} {first:>8.1f} {deep:>8.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""Per-worker time to first response under gunicorn.
+
+    python -m benchmarks.startup --workers 4 --runs 3
+
+Seeds a database, then launches gunicorn on it ``--runs`` times and, from the
+moment the process is started, requests /metrics on fresh connections from
+several threads until every worker (told apart by the ``pid`` label) has
+answered. A worker's time is from launch to its first response, so it
+includes importing the app, any per-worker bootstrap and the first request
+itself. gunicorn reads gunicorn.conf.py from the project directory, so run
+with ``GUNICORN_PRELOAD=0`` to compare against workers importing the app
+themselves.
+"""
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+
+from benchmarks.common import load_app, seed_entries
+from benchmarks.harness import free_port
+
+PID = re.compile(r'pid="(\d+)"')
+METRICS_TOKEN = 'bench'
+
+
+def measure(db_path, workers, timeout=60):
+    port = free_port()
+    env = dict(os.environ, DATABASE_URL=f'sqlite:///{db_path}', JOBS_DIR=tempfile.mkdtemp(prefix='bench-jobs-'),
+               METRICS_TOKEN=METRICS_TOKEN)
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    request = urllib.request.Request(f'http://127.0.0.1:{port}/metrics',
+                                     headers={'Authorization': f'Bearer {METRICS_TOKEN}'})
+    first = {}
+    lock = threading.Lock()
+    t0 = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-w', str(workers), '-b', f'127.0.0.1:{port}',
+                             '--log-level', 'warning', 'app:app'], cwd=root, env=env)
+
+    def poll():
+        while len(first) < workers and time.perf_counter() - t0 < timeout:
+            try:
+                body = urllib.request.urlopen(request, timeout=timeout).read().decode()
+            except OSError:
+                time.sleep(0.01)
+                continue
+            elapsed = time.perf_counter() - t0
+            match = PID.search(body)
+            if match:
+                with lock:
+                    first.setdefault(match.group(1), elapsed)
+
+    threads = [threading.Thread(target=poll) for _ in range(workers * 4)]
+    try:
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    finally:
+        proc.terminate()
+        proc.wait(10)
+    return sorted(first.values())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--entries', type=int, default=10_000)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--runs', type=int, default=3)
+    args = parser.parse_args()
+
+    m = load_app()
+    seed_entries(m, args.entries)
+    db_path = m.app.config['SQLALCHEMY_DATABASE_URI'].replace('sqlite:///', '', 1)
+
+    print(f"{'run':>4} {'first worker s':>15} {'last worker s':>14} {'mean s':>8}")
+    lasts = []
+    for run in range(1, args.runs + 1):
+        times = measure(db_path, args.workers)
+        if len(times) < args.workers:
+            print(f'{run:>4} only {len(times)} of {args.workers} workers answered')
+            continue
+        lasts.append(times[-1])
+        print(f'{run:>4} {times[0]:>15.2f} {times[-1]:>14.2f} {statistics.mean(times):>8.2f}')
+    if lasts:
+        print(f'median time until every worker has answered: {statistics.median(lasts):.2f}s')
+
+
+if __name__ == '__main__':
+    main()
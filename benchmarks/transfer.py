@@ -0,0 +1,85 @@
+"""Bytes sent per dashboard view, first visit and repeat visit, per Accept-Encoding.
+
+    python -m benchmarks.transfer --entries 20000
+
+A view is what the browser asks this app for when it opens the dashboard: the
+HTML, the /static files it references and the JSON that main.js fetches on
+load (/api/dashboard-stats and /reports/daily). The repeat visit replays the
+view the way a browser with a warm cache would. Responses with an immutable
+Cache-Control are not requested again. Every other response is revalidated
+with If-None-Match / If-Modified-Since when it carried a validator, and
+fetched again when it did not. Bytes are response bodies as sent, so
+compressed when the app compressed them. The CDN files (Bootstrap, Chart.js)
+are not counted.
+"""
+import argparse
+import gzip
+import re
+
+from benchmarks.common import load_app, seed_entries
+
+STATIC_REF = re.compile(r'(?:src|href)="(/static/[^"]+)"')
+JSON_ON_LOAD = ['/api/dashboard-stats', '/reports/daily']
+ENCODINGS = ['identity', 'gzip', 'br']
+
+
+def view(client, encoding, cache):
+    """Fetch one dashboard view; returns (requests, body bytes). ``cache`` maps URL -> response headers."""
+    requests = sent = 0
+
+    def get(url):
+        nonlocal requests, sent
+        headers = {'Accept-Encoding': encoding}
+        cached = cache.get(url)
+        if cached is not None:
+            if 'immutable' in cached.get('Cache-Control', ''):
+                return None
+            if 'ETag' in cached:
+                headers['If-None-Match'] = cached['ETag']
+            if 'Last-Modified' in cached:
+                headers['If-Modified-Since'] = cached['Last-Modified']
+        resp = client.get(url, headers=headers)
+        requests += 1
+        sent += len(resp.get_data())
+        if resp.status_code == 200:
+            cache[url] = resp.headers
+        return resp
+
+    html = get('/dashboard')
+    for url in STATIC_REF.findall(decode(html)):
+        get(url)
+    for url in JSON_ON_LOAD:
+        get(url)
+    return requests, sent
+
+
+def decode(resp):
+    data = resp.get_data()
+    encoding = resp.headers.get('Content-Encoding')
+    if encoding == 'br':
+        import brotli
+        data = brotli.decompress(data)
+    elif encoding == 'gzip':
+        data = gzip.decompress(data)
+    return data.decode()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--entries', type=int, default=20_000)
+    args = parser.parse_args()
+
+    m = load_app()
+    seed_entries(m, args.entries)
+    print(f"{'encoding':<10} {'first view':>22} {'repeat view':>22}")
+    for encoding in ENCODINGS:
+        client = m.app.test_client()
+        client.post('/login', data={'username': 'admin', 'password': 'admin'})
+        cache = {}
+        first = view(client, encoding, cache)
+        repeat = view(client, encoding, cache)
+        print(f'{encoding:<10} {first[0]:>3} req {first[1]:>10,} B    {repeat[0]:>3} req {repeat[1]:>10,} B')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,21 @@
+# Picked up automatically by `gunicorn app:app` from the project directory.
+import os
+
+# import app.py once in the master and fork the workers from it, so a new or
+# restarted worker is ready without importing Flask/SQLAlchemy/app itself
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1') != '0'
+
+
+def on_starting(server):
+    # once, before any worker exists: migrate a SQLite file, or stop if a server database is behind
+    import migrations
+    from app import app
+    with app.app_context():
+        migrations.ensure_schema()
+
+
+def post_fork(server, worker):
+    # never share the master's pooled connections (if any) with the workers
+    from app import app, db
+    with app.app_context():
+        db.engine.dispose(close=False)
@@ -0,0 +1,200 @@
+"""Request and SQL instrumentation with a Prometheus-text /metrics endpoint.
+
+    metrics = Instrumentation(app, db)
+
+Records, per endpoint: request latency histograms, SQL query count and SQL time
+per request. Logs queries slower than SLOW_QUERY_MS and flags likely N+1
+patterns (the same statement run more than N_PLUS_ONE_THRESHOLD times in one
+request, e.g. a lazy ``e.user`` load inside a template loop).
+
+Everything is kept in process memory behind one lock; the per-query cost is a
+couple of perf_counter() calls and a dict update, so it is meant to stay on in
+production. Each gunicorn worker keeps its own numbers; the ``pid`` label tells
+them apart when scraped.
+
+/metrics names routes and exposes SQL timings, so it answers 404 unless
+METRICS_TOKEN is set, and then only to ``Authorization: Bearer <token>``. The
+per-response ``Server-Timing`` header (app and SQL time) goes to the same
+authorized requests only, or to every response with SERVER_TIMING=1.
+"""
+import hmac
+import logging
+import os
+import threading
+import time
+from collections import Counter, defaultdict
+
+from flask import g, has_request_context, request, Response, abort
+
+log = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200)
+
+
+class Histogram:
+    """Cumulative-bucket histogram per label value, as Prometheus expects."""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = defaultdict(lambda: [0] * (len(buckets) + 1))
+        self.sums = defaultdict(float)
+
+    def observe(self, label, value):
+        counts = self.counts[label]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[i] += 1
+                break
+        else:
+            counts[-1] += 1
+        self.sums[label] += value
+
+    def render(self, name, label_name, extra):
+        lines = []
+        for label, counts in sorted(self.counts.items()):
+            running = 0
+            for bound, n in zip(self.buckets + ('+Inf',), counts):
+                running += n
+                lines.append(f'{name}_bucket{{{label_name}="{label}",le="{bound}"{extra}}} {running}')
+            lines.append(f'{name}_count{{{label_name}="{label}"{extra}}} {running}')
+            lines.append(f'{name}_sum{{{label_name}="{label}"{extra}}} {self.sums[label]:.6f}')
+        return lines
+
+
+class Instrumentation:
+
+    def __init__(self, app=None, db=None):
+        self._lock = threading.Lock()
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.queries = Histogram(QUERY_BUCKETS)
+        self.sql_seconds = defaultdict(float)
+        self.responses = Counter()
+        self.slow_queries = Counter()
+        self.n_plus_one = Counter()
+        self.gauges = {}
+        if app is not None:
+            self.init_app(app, db)
+
+    def init_app(self, app, db):
+        app.config.setdefault('SLOW_QUERY_MS', float(os.environ.get('SLOW_QUERY_MS', 200)))
+        app.config.setdefault('N_PLUS_ONE_THRESHOLD', int(os.environ.get('N_PLUS_ONE_THRESHOLD', 10)))
+        app.config.setdefault('METRICS_TOKEN', os.environ.get('METRICS_TOKEN'))
+        app.config.setdefault('SERVER_TIMING', os.environ.get('SERVER_TIMING', '0') == '1')
+        self.slow_query_s = app.config['SLOW_QUERY_MS'] / 1000
+        self.n_plus_one_threshold = app.config['N_PLUS_ONE_THRESHOLD']
+        self.token = app.config['METRICS_TOKEN']
+        self.server_timing = app.config['SERVER_TIMING']
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.add_url_rule('/metrics', 'metrics', self.metrics_view)
+        with app.app_context():
+            engine = db.engine
+        db.event.listen(engine, 'before_cursor_execute', self._before_cursor_execute)
+        db.event.listen(engine, 'after_cursor_execute', self._after_cursor_execute)
+        db.event.listen(engine, 'handle_error', self._handle_error)
+
+    def gauge(self, name, help_text, fn):
+        """Expose ``fn()`` (a number, or a {label: number} dict) as a gauge on /metrics."""
+        self.gauges[name] = (help_text, fn)
+
+    # request hooks
+
+    def _before_request(self):
+        g._metrics_start = time.perf_counter()
+        g._metrics_sql_count = 0
+        g._metrics_sql_time = 0.0
+        g._metrics_statements = Counter()
+
+    def _after_request(self, response):
+        start = g.get('_metrics_start')
+        if start is None:
+            return response
+        elapsed = time.perf_counter() - start
+        endpoint = request.endpoint or 'unmatched'
+        sql_count, sql_time = g._metrics_sql_count, g._metrics_sql_time
+        with self._lock:
+            self.latency.observe(endpoint, elapsed)
+            self.queries.observe(endpoint, sql_count)
+            self.sql_seconds[endpoint] += sql_time
+            self.responses[(endpoint, response.status_code)] += 1
+        for statement, n in g._metrics_statements.items():
+            if n > self.n_plus_one_threshold:
+                with self._lock:
+                    self.n_plus_one[endpoint] += 1
+                log.warning('possible N+1 on %s: %d x %s', endpoint, n, statement[:200])
+        if self.server_timing or self.authorized():
+            response.headers['Server-Timing'] = f'app;dur={elapsed * 1000:.1f}, db;dur={sql_time * 1000:.1f}'
+        return response
+
+    # SQLAlchemy hooks
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('_metrics_query_start', []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['_metrics_query_start'].pop()
+        in_request = has_request_context() and '_metrics_start' in g
+        if in_request:
+            g._metrics_sql_count += 1
+            g._metrics_sql_time += elapsed
+            g._metrics_statements[statement] += 1
+        if elapsed >= self.slow_query_s:
+            endpoint = (request.endpoint or 'unmatched') if in_request else 'background'
+            with self._lock:
+                self.slow_queries[endpoint] += 1
+            log.warning('slow query on %s (%.0f ms): %s', endpoint, elapsed * 1000, statement[:500])
+
+    def _handle_error(self, context):
+        # a failed statement never reaches after_cursor_execute; drop its start time here
+        if context.connection is not None and context.execution_context is not None:
+            starts = context.connection.info.get('_metrics_query_start')
+            if starts:
+                starts.pop()
+
+    # exposition
+
+    def authorized(self):
+        return bool(self.token) and hmac.compare_digest(request.headers.get('Authorization', ''),
+                                                        f'Bearer {self.token}')
+
+    def metrics_view(self):
+        if not self.token:
+            abort(404)
+        if not self.authorized():
+            abort(401)
+        return Response(self.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+    def render(self):
+        extra = f',pid="{os.getpid()}"'
+        out = []
+        with self._lock:
+            out.append('# HELP http_request_duration_seconds Request latency by endpoint.')
+            out.append('# TYPE http_request_duration_seconds histogram')
+            out += self.latency.render('http_request_duration_seconds', 'endpoint', extra)
+            out.append('# HELP http_request_sql_queries SQL queries issued per request by endpoint.')
+            out.append('# TYPE http_request_sql_queries histogram')
+            out += self.queries.render('http_request_sql_queries', 'endpoint', extra)
+            out.append('# HELP http_request_sql_seconds_total Time spent in SQL by endpoint.')
+            out.append('# TYPE http_request_sql_seconds_total counter')
+            out += [f'http_request_sql_seconds_total{{endpoint="{e}"{extra}}} {v:.6f}'
+                    for e, v in sorted(self.sql_seconds.items())]
+            out.append('# HELP http_responses_total Responses by endpoint and status.')
+            out.append('# TYPE http_responses_total counter')
+            out += [f'http_responses_total{{endpoint="{e}",status="{s}"{extra}}} {n}'
+                    for (e, s), n in sorted(self.responses.items())]
+            out.append('# HELP sql_slow_queries_total Queries slower than SLOW_QUERY_MS.')
+            out.append('# TYPE sql_slow_queries_total counter')
+            out += [f'sql_slow_queries_total{{endpoint="{e}"{extra}}} {n}' for e, n in sorted(self.slow_queries.items())]
+            out.append('# HELP sql_n_plus_one_total Requests that repeated one statement more than N_PLUS_ONE_THRESHOLD times.')
+            out.append('# TYPE sql_n_plus_one_total counter')
+            out += [f'sql_n_plus_one_total{{endpoint="{e}"{extra}}} {n}' for e, n in sorted(self.n_plus_one.items())]
+        for name, (help_text, fn) in sorted(self.gauges.items()):
+            out.append(f'# HELP {name} {help_text}')
+            out.append(f'# TYPE {name} gauge')
+            value = fn()
+            if isinstance(value, dict):
+                out += [f'{name}{{key="{k}"{extra}}} {v}' for k, v in sorted(value.items())]
+            else:
+                out.append(f'{name}{{pid="{os.getpid()}"}} {value}')
+        return '\n'.join(out) + '\n'
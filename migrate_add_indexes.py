@@ -0,0 +1,109 @@
+"""Add the Entry date-range indexes to an existing database.
+
+``flask --app app db-upgrade`` creates them (migration 0003_entry_indexes);
+this script is kept for its plan check. It is safe to run more than once.
+
+    python migrate_add_indexes.py          # create missing indexes, then check plans
+    python migrate_add_indexes.py --check  # only check plans
+
+The check builds the statements the app itself runs (the dashboard list page
+from keyset_query(), an export batch from export_batch(), a search page from
+search_entries(), the dashboard summary from dashboard_stats_query()), EXPLAINs
+them and exits non-zero if a plan does not use the expected index.
+"""
+import sys
+from contextlib import contextmanager
+from datetime import date, datetime
+
+from app import (app, db, Entry, encode_cursor, keyset_query, export_source, export_batch,
+                 search_entries, search_index_ready, dashboard_stats_query)
+
+CURSOR = encode_cursor('n', [datetime(2024, 1, 15, 12, 0), 1])
+
+
+def dashboard_page():
+    return keyset_query(Entry.query, [Entry.created_at, Entry.id], CURSOR)[1]
+
+
+def export_range():
+    return export_batch(*export_source(date(2024, 1, 1), date(2024, 2, 1)), after=(datetime(2024, 1, 15), 1))
+
+
+def export_user():
+    return export_batch(*export_source(user_id=1), after=(datetime(2024, 1, 15), 1))
+
+
+def search_page():
+    return keyset_query(*search_entries('ค่าน้ำดื่ม'), CURSOR)[1]
+
+
+def summary():
+    return dashboard_stats_query(1, 2024)
+
+
+# (name, statement builder, expected index per dialect)
+PLAN_CHECKS = [
+    ('dashboard list', dashboard_page, {'sqlite': 'ix_entry_created_at', 'postgresql': 'ix_entry_created_at'}),
+    ('export by date', export_range, {'sqlite': 'ix_entry_local_date', 'postgresql': 'ix_entry_local_date'}),
+    ('export by user', export_user,
+     {'sqlite': 'ix_entry_user_id_created_at', 'postgresql': 'ix_entry_user_id_created_at'}),
+    ('search', search_page, {'sqlite': 'entry_fts', 'postgresql': 'ix_entry_search_trgm'}),
+    ('dashboard summary', summary, {'sqlite': 'sqlite_autoindex_daily_rollup_1', 'postgresql': 'daily_rollup_pkey'}),
+]
+
+
+def create_indexes():
+    for ix in Entry.__table__.indexes:
+        ix.create(db.engine, checkfirst=True)
+        print('ok', ix.name)
+
+
+@contextmanager
+def explaining(conn):
+    """Run statements on ``conn`` as EXPLAIN, with the binds the app would send."""
+    prefix = 'EXPLAIN QUERY PLAN ' if conn.dialect.name == 'sqlite' else 'EXPLAIN '
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        return prefix + statement, parameters
+
+    db.event.listen(conn, 'before_cursor_execute', before_cursor_execute, retval=True)
+    try:
+        yield
+    finally:
+        db.event.remove(conn, 'before_cursor_execute', before_cursor_execute)
+
+
+def explain(conn, stmt):
+    if conn.dialect.name == 'postgresql':
+        # PostgreSQL happily seq-scans small tables, so ask what it would do if it could not
+        conn.execute(db.text('SET LOCAL enable_seqscan = off'))
+    stmt = getattr(stmt, 'statement', stmt)  # ORM Query -> Select
+    with explaining(conn):
+        rows = conn.execute(stmt).all()
+    return '\n'.join(str(r[-1]) for r in rows)
+
+
+def check_plans():
+    failed = 0
+    dialect = db.engine.dialect.name
+    with db.engine.connect() as conn:
+        for name, build, expected in PLAN_CHECKS:
+            if name == 'search' and not search_index_ready():
+                print('skip', name, '(no search index)')
+                continue
+            index_name = expected[dialect]
+            plan = explain(conn, build())
+            used = index_name in plan
+            failed += not used
+            print('ok  ' if used else 'FAIL', f'{name}: {index_name}')
+            if not used:
+                print('    ' + plan.replace('\n', '\n    '))
+        conn.rollback()
+    return failed
+
+
+if __name__ == '__main__':
+    with app.app_context():
+        if '--check' not in sys.argv:
+            create_indexes()
+        sys.exit(1 if check_plans() else 0)
@@ -0,0 +1,175 @@
+"""Versioned schema migrations and bootstrap, run once per deploy instead of per worker.
+
+    flask --app app db-upgrade     # apply pending migrations, ensure the admin account
+    flask --app app db-status      # list applied and pending migrations
+    python migrations.py [upgrade|status]
+
+Each migration runs at most once per database and is recorded in the
+schema_migration table. They are all written to be safe on a database that
+already has some of their changes (e.g. from the old migrate_add_* scripts),
+so an existing deployment can be brought under this table by running
+``db-upgrade`` once. New migrations go at the end of MIGRATIONS; never reorder
+or rename applied ones.
+
+Workers do no schema work at all: Railway's preDeployCommand (and the
+Procfile ``release:`` line, which only Heroku reads) run ``db-upgrade`` before
+the new workers start. The server itself calls ensure_schema() once at start
+(gunicorn.conf.py, asgi.py). On PostgreSQL it refuses to start while
+migrations are pending. A SQLite file lives with the web process, where a
+separate pre-deploy container cannot reach it, so there it applies them
+itself, under a file lock.
+"""
+import sys
+from contextlib import contextmanager
+from datetime import datetime
+
+from werkzeug.security import generate_password_hash
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process `python app.py`, nothing to serialize
+    fcntl = None
+
+from app import (app, db, User, Entry, DailyRollup, TH_TZ, backfill_local_periods, create_search_index,
+                 rebuild_rollups)
+
+
+class SchemaMigration(db.Model):
+    __tablename__ = 'schema_migration'
+    name = db.Column(db.String(100), primary_key=True)
+    applied_at = db.Column(db.DateTime, nullable=False)
+
+
+def create_schema():
+    # a new database gets every table, index and the search index here; an old one its missing tables
+    db.create_all()
+
+
+LOCAL_PERIOD_COLUMNS = {'local_date': 'DATE', 'local_month': 'INTEGER', 'local_year': 'INTEGER'}
+
+def entry_local_period():
+    existing = {c['name'] for c in db.inspect(db.engine).get_columns('entry')}
+    with db.engine.begin() as conn:
+        for name, sql_type in LOCAL_PERIOD_COLUMNS.items():
+            if name not in existing:
+                conn.execute(db.text(f'ALTER TABLE entry ADD COLUMN {name} {sql_type}'))
+    print('  backfilled', backfill_local_periods(), 'entries')
+
+
+def entry_indexes():
+    for ix in Entry.__table__.indexes:
+        ix.create(db.engine, checkfirst=True)
+
+
+def search_index():
+    with db.engine.begin() as conn:
+        create_search_index(conn, rebuild=True)
+
+
+def daily_rollups():
+    if db.session.query(DailyRollup.day).first() is None and db.session.query(Entry.id).first() is not None:
+        rebuild_rollups()
+
+
+def archive_tables():
+    # ArchivedYear and PeriodSummary; the per-year archive tables are created by archive_year()
+    db.create_all()
+
+
+def user_version():
+    # the UserVersion table that load_user checks its cached users against
+    db.create_all()
+
+
+def drop_is_income_index():
+    # no query orders by (is_income, created_at) any more; stop maintaining it on every insert
+    with db.engine.begin() as conn:
+        conn.execute(db.text('DROP INDEX IF EXISTS ix_entry_is_income_created_at'))
+
+
+MIGRATIONS = [
+    ('0001_create_schema', create_schema),
+    ('0002_entry_local_period', entry_local_period),
+    ('0003_entry_indexes', entry_indexes),
+    ('0004_search_index', search_index),
+    ('0005_daily_rollups', daily_rollups),
+    ('0006_archive_tables', archive_tables),
+    ('0007_user_version', user_version),
+    ('0008_drop_entry_is_income_index', drop_is_income_index),
+]
+
+
+def applied():
+    SchemaMigration.__table__.create(db.engine, checkfirst=True)
+    return {m.name: m.applied_at for m in SchemaMigration.query.all()}
+
+
+def pending():
+    done = applied()
+    return [(name, fn) for name, fn in MIGRATIONS if name not in done]
+
+
+def ensure_admin():
+    # create default admin if not exists
+    if not User.query.filter_by(username='admin').first():
+        # hashed inline: this runs in the gunicorn master, which must not start the hash pool its workers inherit
+        a = User(username='admin', is_admin=True, password_hash=generate_password_hash(
+            'admin', app.config['PASSWORD_HASH_METHOD'], app.config['PASSWORD_SALT_LENGTH']))
+        db.session.add(a)
+        db.session.commit()
+        print('created user admin')
+
+
+def upgrade():
+    """Apply pending migrations in order, then ensure the bootstrap data. Returns the names applied."""
+    names = []
+    for name, fn in pending():
+        print('applying', name)
+        fn()
+        db.session.add(SchemaMigration(name=name, applied_at=datetime.now(TH_TZ).replace(tzinfo=None)))
+        db.session.commit()
+        names.append(name)
+    ensure_admin()
+    return names
+
+
+@contextmanager
+def migration_lock():
+    """Exclusive lock on a file next to the SQLite database, so concurrent starters migrate one at a time."""
+    path = db.engine.url.database
+    if fcntl is None or not path or path == ':memory:':
+        yield
+        return
+    with open(path + '.migrate.lock', 'w') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def ensure_schema():
+    """Check the schema before serving: migrate a SQLite file in place, refuse to start on a stale server database."""
+    if db.engine.dialect.name == 'sqlite':
+        with migration_lock():
+            upgrade()
+        return
+    names = [name for name, _ in pending()]
+    if names:
+        raise RuntimeError(f'database schema is not up to date ({", ".join(names)} pending); '
+                           f'run `flask --app app db-upgrade` before starting the server')
+
+
+def status():
+    """Print every migration with when it was applied; returns how many are pending."""
+    done = applied()
+    for name, _ in MIGRATIONS:
+        print(f"{done[name]:%Y-%m-%d %H:%M}  {name}" if name in done else f"{'pending':<16}  {name}")
+    return sum(name not in done for name, _ in MIGRATIONS)
+
+
+if __name__ == '__main__':
+    with app.app_context():
+        if sys.argv[1:] == ['status']:
+            sys.exit(1 if status() else 0)
+        upgrade()
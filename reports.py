@@ -0,0 +1,165 @@
+"""pandas reports over the daily rollups: zero-filled series, rolling means, YoY, category trends.
+
+    frame = load_frame(conn, statement)          # chunked read_sql into one DataFrame
+    daily_series(frame, start, end, window=7)
+
+The input is the daily_rollup table grouped by (day, is_income, category_key).
+It holds the same totals as the Entry rows, but it has one row per day and
+category rather than one per entry, so a year of history is a few thousand
+rows. Archived years can come from their frozen monthly summaries instead
+(``monthly`` in load_frame). Every computation is a pivot/reindex/rolling over
+whole columns. Nothing here loops over rows in Python.
+
+pandas is imported on first use, so importing this module (and app.py) stays
+cheap for workers that never serve a report.
+"""
+from datetime import timedelta
+
+FRAME_COLUMNS = ['day', 'is_income', 'category_key', 'total', 'count']
+KINDS = {True: 'income', False: 'expense'}
+
+
+def _pandas():
+    import pandas
+    return pandas
+
+
+def _read(pd, conn, statement, chunksize):
+    frames = list(pd.read_sql(statement, conn, chunksize=chunksize))
+    if not frames:
+        return pd.DataFrame({c: [] for c in FRAME_COLUMNS})
+    return pd.concat(frames, ignore_index=True)
+
+
+def load_frame(conn, statement, chunksize=50_000, monthly=None):
+    """Run ``statement`` (selecting FRAME_COLUMNS) and build one DataFrame from chunked reads.
+
+    ``monthly`` optionally selects the same columns with a YYYYMM period as the
+    day (frozen summaries of archived years). Those rows are dated the first of
+    their month, which is all the month-grained reports need.
+    """
+    pd = _pandas()
+    frame = _read(pd, conn, statement, chunksize)
+    frame['day'] = pd.to_datetime(frame['day'])
+    if monthly is not None:
+        months = _read(pd, conn, monthly, chunksize)
+        if len(months):
+            months['day'] = pd.to_datetime(months['day'].astype(int).astype(str), format='%Y%m')
+            frame = pd.concat([frame, months], ignore_index=True) if len(frame) else months
+    frame['is_income'] = frame['is_income'].astype(bool)
+    frame['total'] = frame['total'].astype(float)
+    frame['category_key'] = frame['category_key'].astype('category')
+    return frame
+
+
+def _by_kind(frame, index, freq):
+    """income / expense / balance columns over ``index`` (a DatetimeIndex), gaps filled with 0."""
+    period = frame['day'].dt.to_period(freq).dt.to_timestamp() if freq != 'D' else frame['day']
+    wide = frame.groupby([period, frame['is_income'].map(KINDS)])['total'].sum().unstack(fill_value=0.0)
+    wide = wide.reindex(index=index, columns=['income', 'expense'], fill_value=0.0)
+    wide.index.name = 'period'
+    wide['balance'] = wide['income'] - wide['expense']
+    return wide
+
+
+def _labels(index, fmt):
+    return [ts.strftime(fmt) for ts in index]
+
+
+def _values(series):
+    return [round(float(v), 2) for v in series]
+
+
+def daily_series(frame, start, end, window=7):
+    """Per-day totals for [start, end) with a ``window``-day rolling mean.
+
+    ``frame`` should also cover the ``window - 1`` days before ``start`` so the
+    first points of the rolling mean are full windows.
+    """
+    pd = _pandas()
+    full = _by_kind(frame, pd.date_range(start - timedelta(days=window - 1), end - timedelta(days=1), freq='D'), 'D')
+    rolling = full.rolling(window, min_periods=1).mean()
+    shown = full.index >= pd.Timestamp(start)
+    full, rolling = full[shown], rolling[shown]
+    return {
+        'labels': _labels(full.index, '%Y-%m-%d'),
+        'window': window,
+        **{k: _values(full[k]) for k in full.columns},
+        'rolling': {k: _values(rolling[k]) for k in rolling.columns},
+    }
+
+
+def monthly_series(frame, start, end, window=3):
+    """Per-month totals for months starting in [start, end) with a ``window``-month rolling mean."""
+    pd = _pandas()
+    index = pd.date_range(pd.Timestamp(start) - pd.DateOffset(months=window - 1), pd.Timestamp(end),
+                          freq='MS', inclusive='left')
+    full = _by_kind(frame, index, 'M')
+    rolling = full.rolling(window, min_periods=1).mean()
+    shown = full.index >= pd.Timestamp(start)
+    full, rolling = full[shown], rolling[shown]
+    return {
+        'labels': _labels(full.index, '%Y-%m'),
+        'window': window,
+        **{k: _values(full[k]) for k in full.columns},
+        'rolling': {k: _values(rolling[k]) for k in rolling.columns},
+    }
+
+
+def year_over_year(frame, year):
+    """Month-by-month totals of ``year`` next to ``year - 1``, with the relative change (None when last year is 0)."""
+    pd = _pandas()
+    months = _by_kind(frame, pd.date_range(f'{year - 1}-01-01', f'{year}-12-01', freq='MS'), 'M')
+    previous, current = months.iloc[:12].reset_index(drop=True), months.iloc[12:].reset_index(drop=True)
+    change = (current - previous) / previous.abs().where(previous != 0)
+    return {
+        'year': year,
+        'labels': list(range(1, 13)),
+        'current': {k: _values(current[k]) for k in current.columns},
+        'previous': {k: _values(previous[k]) for k in previous.columns},
+        'change': {k: [None if pd.isna(v) else round(float(v), 4) for v in change[k]] for k in change.columns},
+        'totals': {
+            'current': {k: round(float(current[k].sum()), 2) for k in current.columns},
+            'previous': {k: round(float(previous[k].sum()), 2) for k in previous.columns},
+        },
+    }
+
+
+def category_trends(frame, start, end, kind, top=8):
+    """Monthly totals per category of one kind, zero-filled, with each category's share and linear trend.
+
+    The ``top`` categories by total keep their own series; the rest are summed
+    into 'อื่นๆ'. ``slope`` is the least-squares change per month.
+    """
+    pd = _pandas()
+    index = pd.date_range(pd.Timestamp(start), pd.Timestamp(end), freq='MS', inclusive='left')
+    rows = frame[frame['is_income'] == (kind == 'income')]
+    month = rows['day'].dt.to_period('M').dt.to_timestamp()
+    wide = rows.groupby([month, rows['category_key'].astype(str)])['total'].sum().unstack(fill_value=0.0)
+    wide = wide.reindex(index=index, fill_value=0.0)
+    order = wide.sum().sort_values(ascending=False).index
+    if len(order) > top:
+        rest = wide[order[top:]].sum(axis=1)
+        wide = wide[order[:top]].copy()
+        wide['อื่นๆ'] = wide.get('อื่นๆ', 0.0) + rest
+        order = wide.sum().sort_values(ascending=False).index
+    wide = wide[order] if len(order) else wide
+
+    # least-squares slope of every column against the month number at once
+    x = pd.Series(range(len(index)), index=index, dtype=float)
+    x_centered = x - x.mean()
+    denom = float((x_centered ** 2).sum())
+    slopes = wide.sub(wide.mean()).mul(x_centered, axis=0).sum() / denom if denom else wide.sum() * 0.0
+    totals = wide.sum()
+    grand = float(totals.sum())
+    return {
+        'kind': kind,
+        'labels': _labels(index, '%Y-%m'),
+        'categories': [{
+            'name': name,
+            'values': _values(wide[name]),
+            'total': round(float(totals[name]), 2),
+            'share': round(float(totals[name]) / grand, 4) if grand else 0.0,
+            'slope': round(float(slopes[name]), 2),
+        } for name in wide.columns],
+    }
@@ -2,6 +2,7 @@ import sys
 import logging
 import traceback
 from app import app
+import migrations
 
 if __name__ == '__main__':
     try:
@@ -18,6 +19,9 @@ if __name__ == '__main__':
         print("Attempting to bind to: http://127.0.0.1:3000")
         print("-" * 50)
         
+        with app.app_context():
+            migrations.upgrade()
+
         # Run without reloader/debugger
         app.run(
             host='127.0.0.1', 
@@ -2,8 +2,23 @@ document.addEventListener('DOMContentLoaded', function(){
   const ctx = document.getElementById('pieChart');
   let chart = null;
 
-  function loadChart(){
+  let stats = null;
+
+  function renderChart(){
+    if (!stats) return;
     const kind = document.getElementById('chart-kind').value;
+    const data = stats.categories[kind];
+    if(chart) chart.destroy();
+    chart = new Chart(ctx, {
+      type: 'pie',
+      data: {
+        labels: data.labels,
+        datasets: [{ data: data.values, backgroundColor: data.labels.map((_,i)=>`hsl(${(i*50)%360} 70% 50%)`)}]
+      }
+    });
+  }
+
+  function loadChart(){
     const month = document.getElementById('chart-month').value;
     const year = document.getElementById('chart-year').value;
 
@@ -13,33 +28,75 @@ document.addEventListener('DOMContentLoaded', function(){
       summaryTitle.textContent = `สรุปยอดประจำเดือน ${month}/${year}`;
     }
 
-    // Load chart data
-    fetch(`/chart-data?kind=${kind}&month=${month}&year=${year}`)
+    // One request for the chart (both kinds) and the monthly summary
+    fetch(`/api/dashboard-stats?month=${month}&year=${year}`)
+      .then(r=>r.json()).then(data=>{
+        stats = data;
+        renderChart();
+        // Update summary values
+        document.querySelector('[data-summary="income"]').textContent = data.month.income.toFixed(2);
+        document.querySelector('[data-summary="expense"]').textContent = data.month.expense.toFixed(2);
+        document.querySelector('[data-summary="balance"]').textContent = data.month.balance.toFixed(2);
+      });
+  }
+
+  // Trend chart from /reports/*: daily as lines, monthly as bars, both with the rolling balance
+  const trendCtx = document.getElementById('trendChart');
+  let trendChart = null;
+
+  function loadTrend(){
+    const range = document.getElementById('trend-range').value;
+    const bar = range === 'monthly';
+    fetch(`/reports/${range}`)
       .then(r=>r.json()).then(data=>{
-        if(chart) chart.destroy();
-        chart = new Chart(ctx, {
-          type: 'pie',
+        if(trendChart) trendChart.destroy();
+        trendChart = new Chart(trendCtx, {
+          type: bar ? 'bar' : 'line',
           data: {
             labels: data.labels,
-            datasets: [{ data: data.values, backgroundColor: data.labels.map((_,i)=>`hsl(${(i*50)%360} 70% 50%)`)}]
+            datasets: [
+              { label: 'รายรับ', data: data.income, backgroundColor: 'hsl(140 60% 45%)', borderColor: 'hsl(140 60% 45%)' },
+              { label: 'รายจ่าย', data: data.expense, backgroundColor: 'hsl(0 70% 55%)', borderColor: 'hsl(0 70% 55%)' },
+              { label: `คงเหลือเฉลี่ย ${data.window} ${bar ? 'เดือน' : 'วัน'}`, data: data.rolling.balance,
+                type: 'line', borderColor: 'hsl(220 70% 50%)', backgroundColor: 'hsl(220 70% 50%)', fill: false }
+            ]
           }
         });
       });
+  }
 
-    // Load monthly stats
-    fetch(`/monthly-stats?month=${month}&year=${year}`)
-      .then(r=>r.json()).then(stats=>{
-        if (stats) {
-          // Update summary values
-          document.querySelector('[data-summary="income"]').textContent = stats.income.toFixed(2);
-          document.querySelector('[data-summary="expense"]').textContent = stats.expense.toFixed(2);
-          document.querySelector('[data-summary="balance"]').textContent = stats.balance.toFixed(2);
+  // Poll background jobs that are still queued/running
+  function pollJob(item){
+    fetch(`/jobs/${item.dataset.jobId}`)
+      .then(r=>r.json()).then(job=>{
+        item.dataset.jobStatus = job.status;
+        let text = job.status;
+        if (job.status === 'queued' || job.status === 'running') {
+          text += ` ${job.progress}` + (job.total ? `/${job.total}` : '');
+          setTimeout(()=>pollJob(item), 2000);
+        } else if (job.error) {
+          text += ` (${job.error})`;
+        }
+        item.querySelector('[data-job-text]').textContent = text;
+        if (job.download_url && !item.querySelector('[data-job-download]')) {
+          const a = document.createElement('a');
+          a.href = job.download_url;
+          a.dataset.jobDownload = '';
+          a.textContent = ' ดาวน์โหลด';
+          item.querySelector('[data-job-text]').after(a);
         }
       });
   }
+  document.querySelectorAll('[data-job-status="queued"], [data-job-status="running"]').forEach(pollJob);
 
   const btn = document.getElementById('load-chart');
   if(btn) btn.addEventListener('click', loadChart);
+  // switching income/expense only re-renders from the data already loaded
+  const kindSelect = document.getElementById('chart-kind');
+  if(kindSelect) kindSelect.addEventListener('change', renderChart);
+  const trendSelect = document.getElementById('trend-range');
+  if(trendSelect) trendSelect.addEventListener('change', loadTrend);
   // initial load
   if(document.getElementById('chart-kind')) loadChart();
+  if(trendCtx) loadTrend();
 });
\ No newline at end of file